@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class ApiConfig(AppConfig):
     name = 'api'
+
+    def ready(self):
+        from . import (authentication, list_cache, metrics,  # noqa: F401
+                       product_index, tag_cache)
@@ -0,0 +1,125 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+""" Аутентификация по токену без запроса к БД на каждый вызов API."""
+
+User = get_user_model()
+
+CACHE_PREFIX = 'auth:token:'
+
+
+class TokenCache:
+    """ Двухуровневый кэш token -> user.
+
+        Первый уровень - LRU в памяти процесса с коротким TTL,
+        второй - Django cache, общий для всех воркеров.
+        При сбросе ключ удаляется из обоих уровней; в других процессах
+        локальная запись живет не дольше LOCAL_TIMEOUT.
+    """
+
+    def __init__(self, size, timeout, local_timeout):
+        self.size = size
+        self.timeout = timeout
+        self.local_timeout = local_timeout
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                self.local_hits += 1
+                return entry[0]
+            self._entries.pop(key, None)
+        user = cache.get(CACHE_PREFIX + key)
+        with self._lock:
+            if user is None:
+                self.misses += 1
+                return None
+            self.shared_hits += 1
+        self._remember(key, user, now)
+        return user
+
+    def set(self, key, user):
+        cache.set(CACHE_PREFIX + key, user, timeout=self.timeout)
+        self._remember(key, user, time.monotonic())
+
+    def _remember(self, key, user, now):
+        with self._lock:
+            self._entries[key] = (user, now + self.local_timeout)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+        cache.delete_many([CACHE_PREFIX + key for key in keys])
+
+    def clear(self):
+        """ Очищает уровень в памяти процесса."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {
+            'local_hits': self.local_hits,
+            'shared_hits': self.shared_hits,
+            'misses': self.misses,
+            'size': len(self._entries),
+        }
+
+
+token_cache = TokenCache(
+    size=getattr(settings, 'TOKEN_CACHE_SIZE', 10000),
+    timeout=getattr(settings, 'TOKEN_CACHE_TIMEOUT', 300),
+    local_timeout=getattr(settings, 'TOKEN_CACHE_LOCAL_TIMEOUT', 10),
+)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """ TokenAuthentication, который берет пользователя из token_cache."""
+
+    def authenticate_credentials(self, key):
+        user = token_cache.get(key)
+        if user is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, user)
+            return user, token
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.'))
+        return user, Token(key=key, user=user)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(instance, **kwargs):
+    token_cache.invalidate(instance.key)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(instance, created, **kwargs):
+    if created:
+        return
+    keys = list(Token.objects.filter(user=instance).values_list(
+        'key', flat=True))
+    if keys:
+        token_cache.invalidate(*keys)
@@ -0,0 +1,586 @@
+import csv
+import itertools
+import math
+import os
+import random
+import time
+from base64 import b64encode
+from types import SimpleNamespace
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import connection
+from django.http import QueryDict
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework.authtoken.models import Token
+from rest_framework.settings import api_settings
+from rest_framework.test import APIClient
+
+from recipes import counters, feed, search, shopping_list
+from recipes.models import (Favorite, Ingredient, Product, Recipe,
+                            ShoppingCart, Subscribe, Tag)
+from users.models import User
+from .authentication import token_cache
+from .filters import RecipeFilter
+
+""" Набор замеров API: количество SQL-запросов и задержки по эндпоинтам."""
+
+PASSWORD = 'Bench-pass-2022'
+IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAAD'
+    'UlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=='
+)
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+    ('Десерт', '#F2C94C', 'dessert'),
+)
+CART_SIZES = (1, 10, 100)
+BULK_SIZES = (1, 10, 100)
+POPULAR_RECIPES = 20
+
+
+def percentile(values, percent):
+    """ Перцентиль по методу ближайшего ранга."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(ordered)) - 1, 0)
+    return ordered[rank]
+
+
+def load_products(file_path=None):
+    """ Загружает каталог продуктов из csv одним bulk_create."""
+    if file_path is None:
+        file_path = os.path.join(
+            settings.BASE_DIR, 'static/data/ingredients.csv')
+    with open(file_path, encoding='utf-8') as f:
+        rows = {tuple(row[:2]) for row in csv.reader(f) if len(row) >= 2}
+    Product.objects.bulk_create(
+        [Product(name=name, measurement_unit=unit)
+         for name, unit in sorted(rows)]
+    )
+    return list(Product.objects.values_list('id', flat=True))
+
+
+def seed(users=1000, recipes=5000, ingredients_per_recipe=8,
+         favorites_per_user=20, carts_per_user=5,
+         subscriptions_per_user=10, random_seed=42):
+    """ Наполняет пустую БД реалистичным набором данных.
+
+        Возвращает словарь с объектами, на которых строятся сценарии.
+    """
+    rnd = random.Random(random_seed)
+    product_ids = load_products()
+    Tag.objects.bulk_create(
+        [Tag(name=name, color=color, slug=slug)
+         for name, color, slug in TAGS])
+    tags = list(Tag.objects.order_by('id'))
+    tag_ids = [tag.id for tag in tags]
+    password = make_password(PASSWORD)
+    User.objects.bulk_create(
+        [User(username=f'user{i}', email=f'user{i}@foodgram.ru',
+              first_name='Имя', last_name='Фамилия', password=password)
+         for i in range(users)]
+    )
+    user_ids = list(User.objects.order_by('id').values_list('id', flat=True))
+    Recipe.objects.bulk_create(
+        [Recipe(author_id=rnd.choice(user_ids), name=f'Рецепт {i}',
+                text='Описание рецепта. ' * 10,
+                cooking_time=rnd.randint(1, 180))
+         for i in range(recipes)]
+    )
+    recipe_ids = list(
+        Recipe.objects.order_by('id').values_list('id', flat=True))
+    recipe_tag = Recipe.tags.through
+    recipe_tag.objects.bulk_create(
+        [recipe_tag(recipe_id=recipe_id, tag_id=tag_id)
+         for recipe_id in recipe_ids
+         for tag_id in rnd.sample(tag_ids, rnd.randint(1, 2))]
+    )
+    Ingredient.objects.bulk_create(
+        [Ingredient(recipe_id=recipe_id, product_id_id=product_id,
+                    amount=rnd.randint(1, 500))
+         for recipe_id in recipe_ids
+         for product_id in rnd.sample(product_ids, ingredients_per_recipe)]
+    )
+    favorites, carts, subscriptions = [], [], []
+    for user_id in user_ids:
+        for recipe_id in rnd.sample(recipe_ids, favorites_per_user):
+            favorites.append(Favorite(user_id=user_id, recipe_id=recipe_id))
+        for recipe_id in rnd.sample(recipe_ids, carts_per_user):
+            carts.append(ShoppingCart(user_id=user_id, recipe_id=recipe_id))
+        authors = rnd.sample(user_ids, subscriptions_per_user + 1)
+        subscriptions.extend(
+            Subscribe(user_id=user_id, author_id=author_id)
+            for author_id in authors if author_id != user_id
+        )
+    Favorite.objects.bulk_create(favorites)
+    ShoppingCart.objects.bulk_create(carts)
+    Subscribe.objects.bulk_create(subscriptions)
+
+    popular_author = User.objects.create(
+        username='popular_author', email='popular_author@foodgram.ru',
+        password=password)
+    Recipe.objects.bulk_create(
+        [Recipe(author=popular_author, name=f'Популярный рецепт {i}',
+                text='Описание', cooking_time=10)
+         for i in range(POPULAR_RECIPES)])
+    Subscribe.objects.bulk_create(
+        [Subscribe(user_id=user_id, author=popular_author)
+         for user_id in user_ids])
+    feed_reader = User.objects.create(
+        username='feed_reader', email='feed_reader@foodgram.ru',
+        password=password)
+    Subscribe.objects.bulk_create(
+        [Subscribe(user=feed_reader, author_id=author_id)
+         for author_id in user_ids])
+    for user_id in [*user_ids, feed_reader.id]:
+        feed.rebuild(user_id)
+
+    reader = User.objects.get(id=user_ids[0])
+    ShoppingCart.objects.bulk_create(
+        [ShoppingCart(user=reader, recipe_id=recipe_id)
+         for recipe_id in rnd.sample(recipe_ids, 20)],
+        ignore_conflicts=True,
+    )
+    idle_author = User.objects.create(
+        username='idle_author', email='idle_author@foodgram.ru',
+        password=password)
+    idle_recipe = Recipe.objects.create(
+        author=idle_author, name='Рецепт без подписчиков',
+        text='Описание', cooking_time=10)
+    idle_recipe.tags.set(tags[:1])
+    login_user = User.objects.create(
+        username='login_user', email='login_user@foodgram.ru',
+        password=password)
+    cart_tokens = {}
+    for size in CART_SIZES:
+        cart_user = User.objects.create(
+            username=f'cart_user{size}', email=f'cart{size}@foodgram.ru',
+            password=password)
+        ShoppingCart.objects.bulk_create(
+            [ShoppingCart(user=cart_user, recipe_id=recipe_id)
+             for recipe_id in rnd.sample(recipe_ids, size)])
+        cart_tokens[size] = Token.objects.create(user=cart_user).key
+    own_recipe = (
+        Recipe.objects.filter(author=reader).order_by('id').first()
+        or Recipe.objects.create(author=reader, name='Свой рецепт',
+                                 text='Описание', cooking_time=5))
+    # Фильтр тэг + автор + избранное должен находить рецепты при любом
+    # размере набора, иначе сценарий не доходит до prefetch.
+    own_recipe.tags.add(tags[0])
+    Favorite.objects.get_or_create(user=reader, recipe=own_recipe)
+    # bulk_create обходит сигналы: производные данные считаются разом.
+    counters.reconcile()
+    search.index()
+    shopping_list.rebuild()
+    return {
+        'reader': reader,
+        'token': Token.objects.create(user=reader).key,
+        'own_recipe': own_recipe,
+        'idle_author': idle_author,
+        'idle_recipe': idle_recipe,
+        'popular_author': popular_author,
+        'feed_reader': feed_reader,
+        'login_user': login_user,
+        'cart_tokens': cart_tokens,
+        'product': Product.objects.order_by('id').first(),
+        'tags': tags,
+        'sizes': {
+            'users': User.objects.count(),
+            'recipes': Recipe.objects.count(),
+            'ingredients': Ingredient.objects.count(),
+            'favorites': Favorite.objects.count(),
+            'shopping_carts': ShoppingCart.objects.count(),
+            'subscriptions': Subscribe.objects.count(),
+            'feed_items': feed.FeedItem.objects.count(),
+            'products': Product.objects.count(),
+        },
+    }
+
+
+def scenarios(data):
+    """ Сценарии по всем маршрутам api/urls.py.
+
+        Каждый сценарий - имя и список шагов (метод, url, тело);
+        шаги одного сценария возвращают данные в исходное состояние,
+        поэтому сценарий можно повторять.
+    """
+    tags = [tag.slug for tag in data['tags']]
+    author = data['own_recipe'].author_id
+    recipe = data['idle_recipe'].id
+    own_recipe = data['own_recipe'].id
+    idle_author = data['idle_author'].id
+    product = data['product']
+    new_recipe = {
+        'name': 'Новый рецепт', 'text': 'Описание', 'cooking_time': 15,
+        'image': IMAGE, 'tags': [data['tags'][0].id],
+        'ingredients': [{'id': product.id, 'amount': 10}],
+    }
+    recipe_list = [
+        ('recipes:list', ''),
+        ('recipes:list:page_50', '?page=50'),
+        ('recipes:list:tags_one', f'?tags={tags[0]}'),
+        ('recipes:list:tags_two', f'?tags={tags[0]}&tags={tags[1]}'),
+        ('recipes:list:author', f'?author={author}'),
+        ('recipes:list:is_favorited_1', '?is_favorited=1'),
+        ('recipes:list:is_favorited_0', '?is_favorited=0'),
+        ('recipes:list:is_in_shopping_cart_1', '?is_in_shopping_cart=1'),
+        ('recipes:list:is_in_shopping_cart_0', '?is_in_shopping_cart=0'),
+        ('recipes:list:tags_author_favorited',
+         f'?tags={tags[0]}&author={author}&is_favorited=1'),
+        ('recipes:list:search', '?search=рецепт'),
+        ('recipes:list:search_selective', '?search=рецепт 42'),
+        ('recipes:list:search_tags', f'?search=описание&tags={tags[0]}'),
+    ]
+    page_size = api_settings.PAGE_SIZE
+    deep_page = max(1, min(1000, data['sizes']['recipes'] // page_size))
+    deep_position = Recipe.objects.order_by('-id').values_list(
+        'id', flat=True)[(deep_page - 1) * page_size]
+    deep_cursor = b64encode(
+        urlencode({'p': deep_position + 1}).encode()).decode()
+    recipe_list += [
+        ('recipes:list:page_deep', f'?page={deep_page}'),
+        ('recipes:cursor:first', '?pagination=cursor'),
+        ('recipes:cursor:deep', f'?cursor={deep_cursor}'),
+    ]
+    cases = [
+        (name, [('get', f'/api/recipes/{query}', None)])
+        for name, query in recipe_list
+    ]
+    cases += [
+        ('recipes:detail', [('get', f'/api/recipes/{recipe}/', None)]),
+        ('recipes:feed', [('get', '/api/recipes/feed/', None)]),
+        ('recipes:create_delete', [
+            ('post', '/api/recipes/', new_recipe),
+            ('delete', '/api/recipes/{id}/', None),
+        ]),
+        ('recipes:update', [
+            ('patch', f'/api/recipes/{own_recipe}/', {
+                'tags': [data['tags'][1].id],
+                'ingredients': [{'id': product.id, 'amount': 20}],
+            }),
+        ]),
+        ('recipes:favorite', [
+            ('post', f'/api/recipes/{recipe}/favorite/', None),
+            ('delete', f'/api/recipes/{recipe}/favorite/', None),
+        ]),
+        ('recipes:shopping_cart', [
+            ('post', f'/api/recipes/{recipe}/shopping_cart/', None),
+            ('delete', f'/api/recipes/{recipe}/shopping_cart/', None),
+        ]),
+        ('recipes:download_shopping_cart', [
+            ('get', '/api/recipes/download_shopping_cart/', None),
+        ]),
+        ('recipes:download_shopping_cart:csv', [
+            ('get', '/api/recipes/download_shopping_cart/?format=csv', None),
+        ]),
+        ('recipes:download_shopping_cart:json', [
+            ('get', '/api/recipes/download_shopping_cart/?format=json', None),
+        ]),
+        ('tags:list', [('get', '/api/tags/', None)]),
+        ('tags:detail', [('get', f'/api/tags/{data["tags"][0].id}/', None)]),
+        ('ingredients:list', [('get', '/api/ingredients/', None)]),
+        ('ingredients:search', [
+            ('get', f'/api/ingredients/?name={product.name[:3]}', None),
+        ]),
+        ('ingredients:search_limit', [
+            ('get', f'/api/ingredients/?name={product.name[:1]}&limit=10',
+             None),
+        ]),
+        ('users:list', [('get', '/api/users/', None)]),
+        ('users:detail', [('get', f'/api/users/{idle_author}/', None)]),
+        ('users:me', [('get', '/api/users/me/', None)]),
+        ('users:subscriptions', [
+            ('get', '/api/users/subscriptions/', None),
+        ]),
+        ('users:subscriptions:recipes_limit', [
+            ('get', '/api/users/subscriptions/?recipes_limit=10', None),
+        ]),
+        ('users:subscribe', [
+            ('post', f'/api/users/{idle_author}/subscribe/', None),
+            ('delete', f'/api/users/{idle_author}/subscribe/', None),
+        ]),
+        ('users:set_password', [
+            ('post', '/api/users/set_password/', {
+                'new_password': PASSWORD, 'current_password': PASSWORD,
+            }),
+        ]),
+    ]
+    cases += bulk_cases(data)
+    return cases
+
+
+def bulk_cases(data):
+    """ Массовые эндпоинты: добавить и убрать пачку размером BULK_SIZES.
+
+        Берутся рецепты и авторы, не связанные с читателем, чтобы
+        сценарий не трогал его данные.
+    """
+    reader = data['reader']
+    size = max(BULK_SIZES)
+    free_recipes = {
+        'favorite': Recipe.objects.exclude(
+            favorite_recipe__user=reader),
+        'shopping_cart': Recipe.objects.exclude(
+            shopping_cart__user=reader),
+    }
+    free_authors = list(User.objects.exclude(
+        follow__user=reader).exclude(id=reader.id).order_by(
+            'id').values_list('id', flat=True)[:size])
+    targets = {
+        (f'recipes/{name}', f'recipes:{name}'): list(
+            queryset.order_by('id').values_list('id', flat=True)[:size])
+        for name, queryset in free_recipes.items()
+    }
+    targets[('users/subscribe', 'users:subscribe')] = free_authors
+    cases = []
+    for (route, name), ids in targets.items():
+        for bulk_size in BULK_SIZES:
+            url = f'/api/{route}/bulk/'
+            cases.append((f'{name}:bulk_{bulk_size}', [
+                ('post', url, {'add': ids[:bulk_size]}),
+                ('post', url, {'remove': ids[:bulk_size]}),
+            ]))
+    return cases
+
+
+def run_step(client, method, url, body, context):
+    url = url.format(**context)
+    response = getattr(client, method)(url, body, format='json')
+    if response.streaming:
+        b''.join(response.streaming_content)
+    if response.status_code >= 400:
+        raise AssertionError(
+            f'{method.upper()} {url} -> {response.status_code}: '
+            f'{getattr(response, "data", "")}')
+    if method == 'post' and isinstance(getattr(response, 'data', None), dict):
+        context['id'] = response.data.get('id')
+    return response
+
+
+def measure(client, steps, repeat):
+    """ Прогоняет шаги сценария repeat раз после одного прогрева.
+
+        Возвращает (наибольшее число запросов за прогон, включая
+        прогрев с холодными кэшами, времена прогонов в мс).
+    """
+    timings, queries = [], 0
+    for _ in range(repeat + 1):
+        context = {}
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            for method, url, body in steps:
+                run_step(client, method, url, body, context)
+            timings.append((time.perf_counter() - started) * 1000)
+        queries = max(queries, len(captured))
+    return queries, timings[1:]
+
+
+def measure_call(func, repeat, cleanup=None):
+    """ Как measure, но для произвольной функции без HTTP."""
+    timings, queries = [], 0
+    for _ in range(repeat + 1):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            result = func()
+            timings.append((time.perf_counter() - started) * 1000)
+        queries = max(queries, len(captured))
+        if cleanup is not None:
+            cleanup(result)
+    return queries, timings[1:]
+
+
+def feed_cases(data):
+    """ Fan-out on write против fan-out on read.
+
+        Чтение: первая страница id ленты подписчика всех авторов
+        из таблицы FeedItem и та же страница через JOIN с подписками.
+        Запись: создание рецепта автором, на которого подписаны все,
+        и автором без подписчиков.
+    """
+    reader = data['feed_reader']
+    page_size = api_settings.PAGE_SIZE
+    on_write = Recipe.objects.filter(
+        feed_items__user=reader).order_by('-id').values_list('id', flat=True)
+    on_read = Recipe.objects.filter(
+        author__follow__user=reader).order_by('-id').values_list(
+            'id', flat=True)
+
+    def create_recipe(author):
+        return lambda: Recipe.objects.create(
+            author=author, name='Рецепт для ленты', text='Описание',
+            cooking_time=10)
+
+    def delete_recipe(recipe):
+        recipe.delete()
+
+    return [
+        ('feed:read:fan_out_on_write',
+         lambda repeat: measure_call(
+             lambda: list(on_write[:page_size]), repeat)),
+        ('feed:read:fan_out_on_read',
+         lambda repeat: measure_call(
+             lambda: list(on_read[:page_size]), repeat)),
+        ('feed:write:popular_author',
+         lambda repeat: measure_call(
+             create_recipe(data['popular_author']), repeat, delete_recipe)),
+        ('feed:write:idle_author',
+         lambda repeat: measure_call(
+             create_recipe(data['idle_author']), repeat, delete_recipe)),
+    ]
+
+
+def filter_cases(data):
+    """ RecipeFilter без кэша страниц: число рецептов и первая страница
+        для всех сочетаний тэгов и для is_favorited/is_in_shopping_cart=0.
+
+        Рядом замеряются прежние варианты - JOIN с DISTINCT по тэгам
+        и exclude() по обратной связи - для сравнения на том же наборе.
+    """
+    reader = data['reader']
+    request = SimpleNamespace(user=reader)
+    page_size = api_settings.PAGE_SIZE
+    recipes = Recipe.objects.order_by('-id')
+
+    def run(queryset):
+        def call():
+            return (queryset.count(),
+                    list(queryset.values_list('id', flat=True)[:page_size]))
+        return lambda repeat: measure_call(call, repeat)
+
+    def filtered(query):
+        return RecipeFilter(QueryDict(query), queryset=recipes,
+                            request=request).qs
+
+    cases = []
+    for size in range(1, len(data['tags']) + 1):
+        for combo in itertools.combinations(data['tags'], size):
+            name = '+'.join(tag.slug for tag in combo)
+            query = '&'.join(f'tags={tag.slug}' for tag in combo)
+            cases += [
+                (f'filter:tags:{name}', run(filtered(query))),
+                (f'filter:tags_join:{name}', run(recipes.filter(
+                    tags__in=combo).distinct())),
+            ]
+    cases += [
+        ('filter:is_favorited_0', run(filtered('is_favorited=0'))),
+        ('filter:is_favorited_0:exclude', run(recipes.exclude(
+            favorite_recipe__user=reader))),
+        ('filter:is_in_shopping_cart_0',
+         run(filtered('is_in_shopping_cart=0'))),
+        ('filter:is_in_shopping_cart_0:exclude', run(recipes.exclude(
+            shopping_cart__user=reader))),
+    ]
+    return cases
+
+
+def login_case(data):
+    """ Вход и выход по токену отдельным пользователем."""
+    client = APIClient()
+    steps = [
+        ('post', '/api/auth/token/login/', {
+            'email': data['login_user'].email, 'password': PASSWORD,
+        }),
+    ]
+
+    def run(repeat):
+        timings, queries = [], 0
+        for _ in range(repeat + 1):
+            client.credentials()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = run_step(client, *steps[0], {})
+                client.credentials(
+                    HTTP_AUTHORIZATION=f'Token {response.data["auth_token"]}')
+                run_step(client, 'post', '/api/auth/token/logout/', None, {})
+                timings.append((time.perf_counter() - started) * 1000)
+            queries = max(queries, len(captured))
+        return queries, timings[1:]
+    return run
+
+
+def run_benchmarks(data, repeat=20, only=None):
+    """ Замеряет все сценарии и возвращает словарь отчета."""
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Token {data["token"]}')
+    runners = [
+        (name, lambda steps=steps: measure(client, steps, repeat))
+        for name, steps in scenarios(data)
+    ]
+    runners.append(('auth:login_logout', lambda: login_case(data)(repeat)))
+    runners += [
+        (name, lambda runner=runner: runner(repeat))
+        for name, runner in feed_cases(data) + filter_cases(data)
+    ]
+    anonymous = APIClient()
+    tag = data['tags'][0].slug
+    for name, query in (('anonymous', ''), ('anonymous_tags', f'?tags={tag}'),
+                        ('anonymous_page_2', '?page=2')):
+        steps = [('get', f'/api/recipes/{query}', None)]
+        runners.append((
+            f'recipes:list:{name}',
+            lambda steps=steps: measure(anonymous, steps, repeat),
+        ))
+    for size, token in data['cart_tokens'].items():
+        cart_client = APIClient()
+        cart_client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        steps = [('get', '/api/recipes/download_shopping_cart/', None)]
+        runners.append((
+            f'recipes:download_shopping_cart:cart_{size}',
+            lambda cart_client=cart_client, steps=steps: measure(
+                cart_client, steps, repeat),
+        ))
+    results = {}
+    for name, runner in runners:
+        if only and not any(name.startswith(prefix) for prefix in only):
+            continue
+        # Прогрев каждого сценария идет с холодными кэшами, иначе число
+        # запросов зависело бы от сценариев, выполненных до него.
+        cache.clear()
+        token_cache.clear()
+        queries, timings = runner()
+        results[name] = {
+            'queries': queries,
+            'runs': len(timings),
+            'total_ms': round(sum(timings), 3),
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+        }
+    return results
+
+
+def check_budget(results, budget):
+    """ Возвращает список превышений бюджета.
+
+        Бюджет: {"<сценарий>": {"queries": N, "p95_ms": M}}, любое
+        из полей можно опустить.
+    """
+    violations = []
+    for name, limits in budget.items():
+        if name not in results:
+            continue
+        for metric, limit in limits.items():
+            value = results[name].get(metric)
+            if value is not None and value > limit:
+                violations.append(f'{name}: {metric} {value} > {limit}')
+    return violations
+
+
+def compare(results, previous):
+    """ Строки сравнения с отчетом предыдущего коммита."""
+    lines = []
+    for name, current in results.items():
+        before = previous.get(name)
+        if before is None:
+            continue
+        lines.append(
+            f'{name}: queries {before["queries"]} -> {current["queries"]}, '
+            f'p95 {before["p95_ms"]} -> {current["p95_ms"]} ms'
+        )
+    return lines
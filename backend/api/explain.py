@@ -0,0 +1,115 @@
+import re
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework.test import APIClient
+
+from .benchmarks import run_step, scenarios
+
+""" Планы SQL-запросов эндпоинтов: полные проходы по таблицам и сортировки."""
+
+# Справочники на десяток строк: полный проход по ним дешевле индекса.
+IGNORED_TABLES = ('recipes_tag',)
+SQLITE_SCAN = re.compile(
+    r'^SCAN (?:TABLE )?(\w+)\b(?! USING| VIRTUAL TABLE)')
+SQLITE_SORT = re.compile(r'USE TEMP B-TREE FOR (.+)')
+POSTGRESQL_SCAN = re.compile(r'Seq Scan on (\w+)')
+POSTGRESQL_SORT = re.compile(r'(?:->\s+|^)((?:Incremental )?Sort)\s+\(')
+
+
+def is_read(sql):
+    return sql.lstrip().upper().startswith(('SELECT', 'WITH'))
+
+
+def explain(sql):
+    """ Строки плана запроса: EXPLAIN (ANALYZE) на PostgreSQL,
+        EXPLAIN QUERY PLAN на SQLite. """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f'EXPLAIN (ANALYZE, FORMAT TEXT) {sql}')
+            return [row[0] for row in cursor.fetchall()]
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+        cursor.execute(f'EXPLAIN {sql}')
+        return [' '.join(str(value) for value in row)
+                for row in cursor.fetchall()]
+
+
+def problems(plan, tables):
+    """ Полные проходы по таблицам из tables и сортировки в строках
+        плана. Проходы по подзапросам и CTE не считаются: у них нет
+        индексов. """
+    if connection.vendor == 'sqlite':
+        scan, sort = SQLITE_SCAN, SQLITE_SORT
+    else:
+        scan, sort = POSTGRESQL_SCAN, POSTGRESQL_SORT
+    found = []
+    for line in plan:
+        line = line.strip()
+        match = scan.search(line)
+        if match and match.group(1) in tables:
+            found.append(f'scan {match.group(1)}')
+        match = sort.search(line)
+        if match:
+            found.append(f'sort {match.group(1)}'.lower())
+    return sorted(set(found))
+
+
+def regressions(results, baseline):
+    """ Проблемы планов, которых нет в базовой линии сценария.
+
+        Базовая линия: {"<сценарий>": ["scan <таблица>", "sort ..."]};
+        сценарии без записи сравниваются с пустым списком.
+    """
+    found = []
+    for name, queries in results.items():
+        accepted = set(baseline.get(name, ()))
+        current = {problem for query in queries
+                   for problem in query['problems']}
+        found += [f'{name}: {problem}'
+                  for problem in sorted(current - accepted)]
+    return found
+
+
+def summary(results):
+    """ Базовая линия из текущих результатов."""
+    return {
+        name: sorted({problem for query in queries
+                      for problem in query['problems']})
+        for name, queries in results.items()
+    }
+
+
+def capture(client, steps):
+    """ Чтения, выполненные шагами сценария, без повторов."""
+    context = {}
+    with CaptureQueriesContext(connection) as captured:
+        for method, url, body in steps:
+            run_step(client, method, url, body, context)
+    return list(dict.fromkeys(
+        query['sql'] for query in captured if is_read(query['sql'])))
+
+
+def explain_scenarios(data, only=None, ignored=IGNORED_TABLES):
+    """ Прогоняет сценарии benchmark_api и разбирает планы их чтений.
+
+        Возвращает {сценарий: [{'sql', 'plan', 'problems'}]}.
+    """
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Token {data["token"]}')
+    tables = set(connection.introspection.table_names()) - set(ignored)
+    results = {}
+    for name, steps in scenarios(data):
+        if only and not any(name.startswith(prefix) for prefix in only):
+            continue
+        results[name] = []
+        for sql in capture(client, steps):
+            plan = explain(sql)
+            results[name].append({
+                'sql': sql,
+                'plan': plan,
+                'problems': problems(plan, tables),
+            })
+    return results
@@ -1,22 +1,24 @@
 from django_filters import rest_framework as filters
 from django.contrib.auth import get_user_model
-from rest_framework.filters import SearchFilter
+from django.db.models import Exists, OuterRef
 
 from rest_framework.exceptions import ValidationError
 
-from recipes.models import Recipe, Tag
+from recipes import search
+from recipes.models import Favorite, Recipe, ShoppingCart
+from .tag_cache import tag_cache
 User = get_user_model()
 
 
-class IngredientSearchFilter(SearchFilter):
-    search_param = 'name'
+def tag_slug_choices():
+    return tag_cache.slug_choices()
 
 
 class RecipeFilter(filters.FilterSet):
-    tags = filters.ModelMultipleChoiceFilter(
+    tags = filters.MultipleChoiceFilter(
         field_name='tags__slug',
-        queryset=Tag.objects.all(),
-        to_field_name='slug',
+        choices=tag_slug_choices,
+        method='get_tags',
     )
     author = filters.ModelChoiceFilter(queryset=User.objects.all())
     is_favorited = filters.BooleanFilter(
@@ -25,25 +27,42 @@ class RecipeFilter(filters.FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method='get_is_in_shopping_cart'
     )
+    search = filters.CharFilter(method='get_search')
 
     class Meta():
         model = Recipe
         fields = ['tags']
 
+    def get_tags(self, queryset, name, value):
+        """ EXISTS по связям рецепт-тэг вместо JOIN и DISTINCT:
+            рецепт с несколькими тэгами из фильтра не дублируется. """
+        if not value:
+            return queryset
+        return queryset.filter(Exists(Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk'),
+            tag_id__in=tag_cache.ids_for_slugs(value),
+        )))
+
+    def get_search(self, queryset, name, value):
+        return search.search(queryset, value)
+
     def get_is_favorited(self, queryset, name, value):
         if self.request.user.is_anonymous:
             raise ValidationError(
                 {"Вы должны авторизоваться, чтобы видеть избранные рецепты"}
             )
-        if value:
-            return queryset.filter(favorite_recipe__user=self.request.user)
-        return queryset.all().exclude(favorite_recipe__user=self.request.user)
+        return self.filter_exists(queryset, Favorite, value)
 
     def get_is_in_shopping_cart(self, queryset, name, value):
         if self.request.user.is_anonymous:
             raise ValidationError(
                 {"Вы должны авторизоваться, чтобы видеть список покупок"}
             )
-        if value:
-            return queryset.filter(shopping_cart__user=self.request.user)
-        return queryset.all().exclude(shopping_cart__user=self.request.user)
+        return self.filter_exists(queryset, ShoppingCart, value)
+
+    def filter_exists(self, queryset, model, value):
+        """ Рецепты, которые есть (или которых нет) в model у пользователя;
+            NOT EXISTS вместо NOT IN из exclude() по обратной связи. """
+        exists = Exists(model.objects.filter(
+            user=self.request.user, recipe=OuterRef('pk')))
+        return queryset.filter(exists if value else ~exists)
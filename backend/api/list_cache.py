@@ -0,0 +1,135 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from recipes.models import ImageJob, Product, Recipe, Tag
+from users.models import User
+from .tag_cache import tag_cache
+
+""" Кэш страниц списка рецептов с поколениями вместо удаления ключей.
+
+    Ключ страницы содержит номер поколения рецептов и поколения тэгов
+    из фильтра. Запись рецепта сдвигает общее поколение, изменение
+    тэга - поколение этого тэга; старые страницы просто перестают
+    читаться и истекают через RECIPE_LIST_CACHE_TIMEOUT.
+"""
+
+GENERATION_KEY = 'recipes:generation'
+TAG_GENERATION_KEY = 'recipes:tag:{}:generation'
+PAGE_KEY = 'recipes:list:{}'
+# Параметры, из которых складывается ключ; с любыми другими
+# (поиск, фильтры пользователя, курсор) список не кэшируется.
+PARAMS = ('page', 'limit', 'tags', 'author')
+# Поля пользователя, которые видны в авторе рецепта на странице.
+AUTHOR_FIELDS = ('username', 'email', 'first_name', 'last_name')
+
+
+def timeout():
+    return getattr(settings, 'RECIPE_LIST_CACHE_TIMEOUT', 600)
+
+
+def generations(keys):
+    """ Поколения по ключам. Пропавший ключ начинается со времени,
+        а не с нуля, чтобы не совпасть со старыми страницами. """
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            cache.add(key, time.time_ns(), timeout=None)
+            values[key] = cache.get(key)
+    return [values[key] for key in keys]
+
+
+def bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+
+
+def bump_recipes():
+    """ Сдвигает поколение после коммита, чтобы страницу не собрали
+        заново из данных незавершенной транзакции. """
+    transaction.on_commit(lambda: bump(GENERATION_KEY))
+
+
+def page_key(request):
+    """ Ключ страницы для кэшируемого запроса или None."""
+    params = request.query_params
+    if any(name not in PARAMS for name in params):
+        return None
+    tags = sorted(set(params.getlist('tags')))
+    tag_ids = tag_cache.ids_for_slugs(tags)
+    if len(tag_ids) != len(tags):
+        return None
+    page = params.get('page', '1')
+    normalized = '|'.join((
+        request.build_absolute_uri('/'),
+        '1' if page in ('', '1') else page,
+        params.get('limit', ''),
+        params.get('author', ''),
+        ','.join(tags),
+    ))
+    keys = [GENERATION_KEY] + [
+        TAG_GENERATION_KEY.format(tag_id) for tag_id in sorted(tag_ids)]
+    state = ':'.join(str(value) for value in generations(keys))
+    return PAGE_KEY.format(hashlib.sha1(
+        f'{state}|{normalized}'.encode()).hexdigest())
+
+
+def get_page(key):
+    return cache.get(key)
+
+
+def set_page(key, entry):
+    cache.set(key, entry, timeout=timeout())
+
+
+# Тэги и ингредиенты рецепта меняются в одной транзакции с save()
+# рецепта, поэтому отдельные сигналы для них не нужны: с ними Django
+# не смог бы удалять и добавлять эти строки без лишних SELECT.
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_recipes(**kwargs):
+    bump_recipes()
+
+
+@receiver(pre_save, sender=User)
+def remember_author_changes(instance, using, update_fields=None, **kwargs):
+    """ Отмечает, изменилось ли что-то из AUTHOR_FIELDS. Вход, смена
+        пароля и счетчики этих полей не касаются и запроса не делают. """
+    fields = [field for field in AUTHOR_FIELDS
+              if update_fields is None or field in update_fields]
+    instance._author_changed = False
+    if instance._state.adding or not fields:
+        return
+    saved = User.objects.using(using).filter(
+        pk=instance.pk).values(*fields).first()
+    instance._author_changed = saved is not None and any(
+        saved[field] != getattr(instance, field) for field in fields)
+
+
+@receiver(post_save, sender=User)
+def invalidate_author(instance, created, **kwargs):
+    # У нового пользователя еще нет рецептов на страницах.
+    if not created and getattr(instance, '_author_changed', False):
+        bump_recipes()
+
+
+@receiver(post_save, sender=ImageJob)
+def invalidate_thumbnails(instance, **kwargs):
+    if instance.status == ImageJob.DONE:
+        bump_recipes()
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tag(instance, **kwargs):
+    key = TAG_GENERATION_KEY.format(instance.pk)
+    transaction.on_commit(lambda: bump(key))
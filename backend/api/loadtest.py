@@ -0,0 +1,211 @@
+import http.client
+import os
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from .benchmarks import percentile
+
+""" Нагрузочные замеры через настоящий HTTP-сервер."""
+
+HOST = '127.0.0.1'
+SERVER_APPS = {
+    'wsgi': ('foodgram.wsgi:application',),
+    'asgi': ('foodgram.asgi:application',
+             '--worker-class', 'uvicorn.workers.UvicornWorker'),
+}
+QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind((HOST, 0))
+        return sock.getsockname()[1]
+
+
+def server_environ():
+    """ Окружение сервера с той же БД, что у текущего подключения
+        (тестовой после create_test_db) и без реплик. """
+    environ = dict(os.environ)
+    environ.update(
+        DB_ENGINE=connection.settings_dict['ENGINE'],
+        POSTGRES_DB=str(connection.settings_dict['NAME']),
+        DB_REPLICAS='',
+        DJANGO_SETTINGS_MODULE=os.environ.get(
+            'DJANGO_SETTINGS_MODULE', 'foodgram.settings'),
+    )
+    return environ
+
+
+class Server:
+    """ gunicorn с приложением WSGI или ASGI в отдельном процессе."""
+
+    def __init__(self, mode='wsgi', workers=2, timeout=30):
+        self.mode = mode
+        self.workers = workers
+        self.timeout = timeout
+        self.port = free_port()
+        self.process = None
+
+    def __enter__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', *SERVER_APPS[self.mode],
+             '--workers', str(self.workers),
+             '--bind', f'{HOST}:{self.port}',
+             '--log-level', 'warning'],
+            cwd=settings.BASE_DIR, env=server_environ())
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f'Сервер {self.mode} не запустился')
+            try:
+                socket.create_connection((HOST, self.port), 1).close()
+                return self
+            except OSError:
+                time.sleep(0.1)
+        self.__exit__()
+        raise RuntimeError(
+            f'Сервер {self.mode} не ответил за {self.timeout} с')
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        try:
+            self.process.wait(self.timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+def headers_for(token=None, body=None):
+    headers = {'Connection': 'close'}
+    if token:
+        headers['Authorization'] = f'Token {token}'
+    if body is not None:
+        headers['Content-Type'] = 'application/json'
+        headers['Content-Length'] = str(len(body))
+    return headers
+
+
+def request(port, method, path, token=None, body=None, timeout=30):
+    """ Один HTTP-запрос; возвращает (статус, секунды, число SQL-запросов
+        из Server-Timing или None). """
+    start = time.perf_counter()
+    conn = http.client.HTTPConnection(HOST, port, timeout=timeout)
+    try:
+        conn.request(method.upper(), path, body=body,
+                     headers=headers_for(token, body))
+        response = conn.getresponse()
+        response.read()
+        status = response.status
+        queries = QUERIES.search(response.getheader('Server-Timing') or '')
+    except (OSError, http.client.HTTPException):
+        status, queries = None, None
+    finally:
+        conn.close()
+    return (status, time.perf_counter() - start,
+            int(queries.group(1)) if queries else None)
+
+
+def slow_request(port, method, path, token=None, body=b'{}',
+                 delay=0.1, timeout=30):
+    """ Запрос медленного клиента: тело уходит по байту раз в delay."""
+    start = time.perf_counter()
+    lines = [f'{method.upper()} {path} HTTP/1.1', f'Host: {HOST}:{port}']
+    lines += [f'{name}: {value}'
+              for name, value in headers_for(token, body).items()]
+    try:
+        with socket.create_connection((HOST, port), timeout) as sock:
+            sock.sendall(('\r\n'.join(lines) + '\r\n\r\n').encode())
+            for byte in body:
+                time.sleep(delay)
+                sock.sendall(bytes([byte]))
+            response = http.client.HTTPResponse(sock)
+            response.begin()
+            response.read()
+            status = response.status
+    except (OSError, http.client.HTTPException):
+        status = None
+    return status, time.perf_counter() - start, None
+
+
+class Stats:
+    """ Потокобезопасный сбор результатов по видам запросов."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.kinds = {}
+
+    def add(self, kind, status, seconds, queries=None):
+        with self._lock:
+            entry = self.kinds.setdefault(
+                kind, {'timings': [], 'errors': 0, 'queries': []})
+            entry['timings'].append(seconds * 1000)
+            # Оборванный ответ (None) и 4xx в сценариях - тоже ошибки:
+            # шаги сценариев рассчитаны на успешные ответы.
+            if status is None or status >= 400:
+                entry['errors'] += 1
+            if queries is not None:
+                entry['queries'].append(queries)
+
+    def report(self, duration, total=None):
+        """ Сводка по видам запросов; с total - еще и по всем сразу
+            под этим именем. """
+        entries = dict(self.kinds)
+        if total is not None and entries:
+            kinds = self.kinds.values()
+            entries[total] = {
+                'timings': [value for entry in kinds
+                            for value in entry['timings']],
+                'errors': sum(entry['errors'] for entry in kinds),
+                'queries': [value for entry in kinds
+                            for value in entry['queries']],
+            }
+        return {kind: self.summary(entry, duration)
+                for kind, entry in sorted(entries.items())}
+
+    @staticmethod
+    def summary(entry, duration):
+        timings = entry['timings']
+        summary = {
+            'requests': len(timings),
+            'rps': round(len(timings) / duration, 1),
+            'errors': entry['errors'],
+            'error_rate': round(entry['errors'] / len(timings), 4),
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+        }
+        if entry['queries']:
+            summary['queries_per_request'] = round(
+                sum(entry['queries']) / len(entry['queries']), 2)
+        return summary
+
+
+def run_clients(clients, duration, total=None):
+    """ Крутит каждого клиента в своем потоке duration секунд.
+
+        clients - функции без аргументов: один заход клиента, который
+        возвращает пары (вид запроса, результат request()).
+        total - имя строки отчета по всем запросам вместе.
+    """
+    stats = Stats()
+    deadline = time.monotonic() + duration
+
+    def loop(action):
+        while time.monotonic() < deadline:
+            for kind, result in action():
+                stats.add(kind, *result)
+
+    threads = [threading.Thread(target=loop, args=(client,), daemon=True)
+               for client in clients]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return stats.report(time.monotonic() - start, total)
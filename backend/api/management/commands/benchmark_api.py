@@ -0,0 +1,86 @@
+import json
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (override_settings, setup_test_environment,
+                               teardown_test_environment)
+
+from api.benchmarks import check_budget, compare, run_benchmarks, seed
+
+""" Основная логика команды benchmark_api для замеров эндпоинтов API"""
+
+BUDGET_PATH = os.path.join(settings.BASE_DIR, 'benchmark_budget.json')
+
+
+class Command(BaseCommand):
+    """ Замеряет число SQL-запросов и задержки всех эндпоинтов API
+        на отдельной тестовой БД и сверяет их с бюджетом."""
+
+    help = 'Бенчмарк эндпоинтов API с проверкой бюджета запросов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=5000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument(
+            '--only', nargs='*',
+            help='Префиксы имен сценариев, например recipes:list.')
+        parser.add_argument('--budget', default=BUDGET_PATH)
+        parser.add_argument('--report', default='benchmark_report.json')
+        parser.add_argument(
+            '--compare', dest='previous',
+            help='Отчет предыдущего коммита для сравнения.')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True)
+        try:
+            with tempfile.TemporaryDirectory() as media_root:
+                with override_settings(
+                        MEDIA_ROOT=media_root,
+                        PASSWORD_HASHERS=[
+                            'django.contrib.auth.hashers.MD5PasswordHasher'
+                        ]):
+                    data = seed(users=options['users'],
+                                recipes=options['recipes'])
+                    self.stdout.write(f'Данные: {data["sizes"]}')
+                    results = run_benchmarks(
+                        data, repeat=options['repeat'], only=options['only'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:45} {result["queries"]:4} queries  '
+                f'p50 {result["p50_ms"]:8.2f} ms  '
+                f'p95 {result["p95_ms"]:8.2f} ms'
+            )
+        report = {
+            'vendor': connection.vendor,
+            'dataset': data['sizes'],
+            'repeat': options['repeat'],
+            'endpoints': results,
+        }
+        with open(options['report'], 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        self.stdout.write(f'Отчет сохранен в {options["report"]}')
+
+        if options['previous']:
+            with open(options['previous'], encoding='utf-8') as f:
+                previous = json.load(f)['endpoints']
+            for line in compare(results, previous):
+                self.stdout.write(line)
+
+        if os.path.exists(options['budget']):
+            with open(options['budget'], encoding='utf-8') as f:
+                budget = json.load(f)
+            violations = check_budget(results, budget)
+            if violations:
+                raise CommandError(
+                    'Превышен бюджет:\n' + '\n'.join(violations))
+            self.stdout.write(self.style.SUCCESS('Бюджет соблюден'))
@@ -0,0 +1,133 @@
+import json
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import (override_settings, setup_test_environment,
+                               teardown_test_environment)
+
+from rest_framework.authtoken.models import Token
+
+from api import loadtest
+from api.benchmarks import seed
+from users.models import User
+
+""" Команда benchmark_servers: пропускная способность под WSGI и ASGI."""
+
+SLOW_BODY = b'{"slow": "' + b' ' * 20 + b'"}'
+
+
+class Command(BaseCommand):
+    """ Поднимает gunicorn с синхронными воркерами (WSGI) и с воркерами
+        uvicorn (ASGI) на одной тестовой БД и нагружает оба одинаково:
+        быстрые клиенты переключают избранное, медленные отправляют
+        тело запроса на подписку по байту, часть клиентов читает список
+        рецептов. """
+
+    help = 'Сравнение пропускной способности WSGI и ASGI.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--duration', type=float, default=10)
+        parser.add_argument(
+            '--clients', type=int, default=16,
+            help='Быстрые клиенты избранного.')
+        parser.add_argument(
+            '--slow-clients', type=int, default=4,
+            help='Клиенты, которые медленно отправляют тело запроса.')
+        parser.add_argument(
+            '--slow-delay', type=float, default=0.05,
+            help='Пауза между байтами тела медленного клиента, с.')
+        parser.add_argument(
+            '--list-clients', type=int, default=2,
+            help='Клиенты, читающие список рецептов.')
+        parser.add_argument(
+            '--modes', nargs='*', default=list(loadtest.SERVER_APPS))
+        parser.add_argument('--report', default='servers_report.json')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        with tempfile.TemporaryDirectory() as directory:
+            # Серверы работают в других процессах, поэтому тестовая
+            # SQLite должна быть файлом, а не базой в памяти.
+            if connection.vendor == 'sqlite':
+                connection.settings_dict['TEST']['NAME'] = os.path.join(
+                    directory, 'benchmark_servers.sqlite3')
+            old_name = connection.creation.create_test_db(
+                verbosity=0, autoclobber=True)
+            try:
+                with override_settings(PASSWORD_HASHERS=[
+                        'django.contrib.auth.hashers.MD5PasswordHasher']):
+                    data = seed(users=options['users'],
+                                recipes=options['recipes'])
+                    results = {
+                        mode: self.run_mode(mode, data, options)
+                        for mode in options['modes']
+                    }
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                teardown_test_environment()
+
+        for mode, kinds in results.items():
+            for kind, result in kinds.items():
+                self.stdout.write(
+                    f'{mode:5} {kind:11} {result["requests"]:6} req  '
+                    f'{result["rps"]:8.1f} rps  '
+                    f'p50 {result["p50_ms"]:8.2f} ms  '
+                    f'p95 {result["p95_ms"]:8.2f} ms  '
+                    f'errors {result["errors"]}'
+                )
+        report = {
+            'vendor': connection.vendor,
+            'workers': options['workers'],
+            'duration': options['duration'],
+            'clients': options['clients'],
+            'slow_clients': options['slow_clients'],
+            'list_clients': options['list_clients'],
+            'modes': results,
+        }
+        with open(options['report'], 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        self.stdout.write(f'Отчет сохранен в {options["report"]}')
+
+    def run_mode(self, mode, data, options):
+        users = User.objects.exclude(
+            id=data['idle_author'].id).order_by('id')[
+                :options['clients'] + options['slow_clients']]
+        tokens = [Token.objects.get_or_create(user=user)[0].key
+                  for user in users]
+        recipe = data['idle_recipe'].id
+        favorite = f'/api/recipes/{recipe}/favorite/'
+        subscribe = f'/api/users/{data["idle_author"].id}/subscribe/'
+
+        with loadtest.Server(mode, workers=options['workers']) as server:
+            port = server.port
+
+            def toggle(token):
+                return lambda: (
+                    ('favorite', loadtest.request(
+                        port, 'post', favorite, token)),
+                    ('favorite', loadtest.request(
+                        port, 'delete', favorite, token)),
+                )
+
+            def slow(token):
+                return lambda: (
+                    ('slow', loadtest.slow_request(
+                        port, 'post', subscribe, token, SLOW_BODY,
+                        delay=options['slow_delay'])),
+                    ('unsubscribe', loadtest.request(
+                        port, 'delete', subscribe, token)),
+                )
+
+            def browse():
+                return (('list', loadtest.request(
+                    port, 'get', '/api/recipes/')),)
+
+            clients = [toggle(token) for token in tokens[:options['clients']]]
+            clients += [slow(token) for token in tokens[options['clients']:]]
+            clients += [browse] * options['list_clients']
+            return loadtest.run_clients(clients, options['duration'])
@@ -0,0 +1,121 @@
+import json
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (override_settings, setup_test_environment,
+                               teardown_test_environment)
+
+from api.benchmarks import seed
+from api.explain import (IGNORED_TABLES, explain_scenarios, regressions,
+                         summary)
+
+""" Команда explain_hot_queries: планы запросов всех эндпоинтов API."""
+
+BASELINE_PATH = os.path.join(settings.BASE_DIR, 'explain_baseline.json')
+
+
+class Command(BaseCommand):
+    """ Наполняет тестовую БД, как benchmark_api, выполняет сценарии
+        эндпоинтов и показывает для каждого чтения полные проходы
+        по таблицам и сортировки из плана запроса. Новые проблемы
+        относительно базовой линии для этой СУБД - ошибка. """
+
+    help = 'Планы SQL-запросов эндпоинтов: seq scan и сортировки.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=5000)
+        parser.add_argument(
+            '--only', nargs='*',
+            help='Префиксы имен сценариев, например recipes:list.')
+        parser.add_argument(
+            '--ignore', nargs='*', default=list(IGNORED_TABLES),
+            help='Таблицы, полный проход по которым допустим.')
+        parser.add_argument(
+            '--plans', action='store_true',
+            help='Печатать планы целиком.')
+        parser.add_argument('--report', help='Сохранить планы в JSON.')
+        parser.add_argument('--baseline', default=BASELINE_PATH)
+        parser.add_argument(
+            '--save-baseline', action='store_true',
+            help='Записать текущие проблемы как допустимые.')
+
+    def handle(self, *args, **options):
+        results = self.explain(options)
+        self.print_results(results, options['plans'])
+        if options['report']:
+            with open(options['report'], 'w', encoding='utf-8') as f:
+                json.dump({'vendor': connection.vendor, 'endpoints': results},
+                          f, ensure_ascii=False, indent=2)
+            self.stdout.write(f'Отчет сохранен в {options["report"]}')
+        if options['save_baseline']:
+            self.save_baseline(results, options['baseline'])
+        else:
+            self.check_baseline(results, options['baseline'])
+
+    def explain(self, options):
+        """ Планы сценариев на наполненной тестовой БД."""
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True)
+        try:
+            with tempfile.TemporaryDirectory() as media_root:
+                with override_settings(
+                        MEDIA_ROOT=media_root,
+                        PASSWORD_HASHERS=[
+                            'django.contrib.auth.hashers.MD5PasswordHasher'
+                        ]):
+                    data = seed(users=options['users'],
+                                recipes=options['recipes'])
+                    # Планировщик выбирает индексы по статистике таблиц.
+                    with connection.cursor() as cursor:
+                        cursor.execute('ANALYZE')
+                    return explain_scenarios(
+                        data, only=options['only'],
+                        ignored=options['ignore'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def print_results(self, results, plans):
+        for name, queries in results.items():
+            bad = [query for query in queries if query['problems']]
+            style = self.style.WARNING if bad else self.style.SUCCESS
+            self.stdout.write(style(
+                f'{name:45} {len(queries):3} reads  {len(bad):3} flagged'))
+            for query in queries:
+                if query['problems'] or plans:
+                    self.print_query(query, plans)
+
+    def print_query(self, query, plans):
+        self.stdout.write(f'    {query["sql"][:200]}')
+        if query['problems']:
+            self.stdout.write('    -> ' + ', '.join(query['problems']))
+        if plans:
+            for line in query['plan']:
+                self.stdout.write(f'       {line}')
+
+    def load_baseline(self, path):
+        if not os.path.exists(path):
+            return {}
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def save_baseline(self, results, path):
+        baseline = self.load_baseline(path)
+        baseline.setdefault(connection.vendor, {}).update(summary(results))
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, ensure_ascii=False, indent=4,
+                      sort_keys=True)
+        self.stdout.write(f'Базовая линия сохранена в {path}')
+
+    def check_baseline(self, results, path):
+        baseline = self.load_baseline(path)
+        found = regressions(results, baseline.get(connection.vendor, {}))
+        if found:
+            raise CommandError(
+                'Новые seq scan и сортировки:\n' + '\n'.join(found))
+        self.stdout.write(self.style.SUCCESS('Планы не ухудшились'))
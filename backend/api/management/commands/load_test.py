@@ -0,0 +1,232 @@
+import json
+import os
+import random
+import tempfile
+from urllib.parse import urlencode
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (override_settings, setup_test_environment,
+                               teardown_test_environment)
+
+from rest_framework.authtoken.models import Token
+from rest_framework.settings import api_settings
+
+from api import loadtest
+from api.benchmarks import seed
+from recipes.models import Favorite, Product, Recipe, ShoppingCart, Tag
+from users.models import User
+
+""" Команда load_test: нагрузка на API по взвешенным сценариям."""
+
+# Доля заходов клиента, приходящаяся на сценарий.
+WEIGHTS = {
+    'browse': 40,
+    'filter_tags': 20,
+    'favorite': 10,
+    'shopping_cart': 10,
+    'download_shopping_cart': 5,
+    'ingredients': 15,
+}
+TOTAL = 'total'
+# Потоковые ответы читают БД уже после заголовка Server-Timing,
+# число запросов по ним неизвестно.
+STREAMING = ('download_shopping_cart',)
+BROWSE_PAGES = 5
+POOL_SIZE = 1000
+
+
+def parse_weights(values):
+    weights = dict(WEIGHTS)
+    for value in values or ():
+        name, _, weight = value.partition('=')
+        if name not in WEIGHTS or not weight.isdigit():
+            raise CommandError(
+                f'Вес {value}: ожидается имя=число, имена: '
+                + ', '.join(WEIGHTS))
+        weights[name] = int(weight)
+    weights = {name: weight for name, weight in weights.items() if weight}
+    if not weights:
+        raise CommandError('Все веса нулевые')
+    return weights
+
+
+class Client:
+    """ Виртуальный пользователь: на каждом заходе выбирает сценарий
+        по весам и выполняет его шаги. Переключения избранного
+        и корзины возвращают данные в исходное состояние. """
+
+    def __init__(self, port, token, weights, fixtures, random_seed):
+        self.port = port
+        self.token = token
+        self.names = list(weights)
+        self.weights = list(weights.values())
+        self.fixtures = fixtures
+        self.rnd = random.Random(random_seed)
+
+    def __call__(self):
+        name = self.rnd.choices(self.names, weights=self.weights)[0]
+        return list(self.run(name))
+
+    def request(self, method, path):
+        return loadtest.request(self.port, method, path, self.token)
+
+    def run(self, name):
+        for step in getattr(self, name)():
+            status, seconds, queries = self.request(*step)
+            if name in STREAMING:
+                queries = None
+            yield name, (status, seconds, queries)
+
+    def browse(self):
+        page = self.rnd.randint(1, self.fixtures['pages'])
+        return [('get', f'/api/recipes/?page={page}')]
+
+    def filter_tags(self):
+        tags = self.fixtures['tags']
+        chosen = self.rnd.sample(tags, self.rnd.randint(1, min(3, len(tags))))
+        query = urlencode([('tags', slug) for slug in chosen])
+        return [('get', f'/api/recipes/?{query}')]
+
+    def toggle(self, name, pool):
+        recipe = self.rnd.choice(self.fixtures[pool][self.token])
+        path = f'/api/recipes/{recipe}/{name}/'
+        return [('post', path), ('delete', path)]
+
+    def favorite(self):
+        return self.toggle('favorite', 'free_favorites')
+
+    def shopping_cart(self):
+        return self.toggle('shopping_cart', 'free_carts')
+
+    def download_shopping_cart(self):
+        return [('get', '/api/recipes/download_shopping_cart/')]
+
+    def ingredients(self):
+        prefix = self.rnd.choice(self.fixtures['prefixes'])
+        return [('get', f'/api/ingredients/?{urlencode({"name": prefix})}')]
+
+
+def free_recipes(model, users, pool):
+    """ Рецепты из pool, которых еще нет у каждого пользователя в model."""
+    taken = {}
+    for user_id, recipe_id in model.objects.filter(
+            user__in=users, recipe__in=pool).values_list('user', 'recipe'):
+        taken.setdefault(user_id, set()).add(recipe_id)
+    return {user.id: [recipe for recipe in pool
+                      if recipe not in taken.get(user.id, ())] or pool
+            for user in users}
+
+
+def fixtures(concurrency):
+    """ Токены клиентов и данные для запросов из текущей БД."""
+    users = list(User.objects.filter(is_staff=False).order_by('id')[
+        :concurrency])
+    if not users or not Recipe.objects.exists():
+        raise CommandError('В БД нет пользователей или рецептов')
+    tokens = {user.id: Token.objects.get_or_create(user=user)[0].key
+              for user in users}
+    pool = list(Recipe.objects.order_by('-id').values_list(
+        'id', flat=True)[:POOL_SIZE])
+    names = Product.objects.values_list('name', flat=True)
+    pages = -(-Recipe.objects.count() // api_settings.PAGE_SIZE)
+    return {
+        'tokens': list(tokens.values()),
+        'pages': max(1, min(BROWSE_PAGES, pages)),
+        'tags': list(Tag.objects.values_list('slug', flat=True)),
+        'prefixes': sorted({name[:2].lower() for name in names}) or [''],
+        'free_favorites': {
+            tokens[user_id]: recipes for user_id, recipes in
+            free_recipes(Favorite, users, pool).items()},
+        'free_carts': {
+            tokens[user_id]: recipes for user_id, recipes in
+            free_recipes(ShoppingCart, users, pool).items()},
+    }
+
+
+class Command(BaseCommand):
+    """ Поднимает gunicorn (WSGI или ASGI) на тестовой БД с данными
+        benchmark_api или на текущей БД (--existing) и гоняет по нему
+        клиентов в потоках: листание и фильтр рецептов по тэгам,
+        избранное, корзина, список покупок, поиск ингредиентов. """
+
+    help = 'Нагрузочный тест API по взвешенным сценариям.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=5000)
+        parser.add_argument(
+            '--existing', action='store_true',
+            help='Нагружать текущую БД, например после generate_dataset.')
+        parser.add_argument(
+            '--mode', choices=list(loadtest.SERVER_APPS), default='wsgi')
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--duration', type=float, default=30)
+        parser.add_argument(
+            '--weights', nargs='*',
+            help='Веса сценариев, например browse=50 favorite=0.')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--report', default='load_test_report.json')
+
+    def handle(self, *args, **options):
+        weights = parse_weights(options['weights'])
+        if options['existing']:
+            results = self.run(weights, options)
+        else:
+            results = self.run_on_test_db(weights, options)
+
+        for kind, result in results.items():
+            self.stdout.write(
+                f'{kind:24} {result["requests"]:7} req  '
+                f'{result["rps"]:8.1f} rps  '
+                f'p50 {result["p50_ms"]:8.2f}  '
+                f'p95 {result["p95_ms"]:8.2f}  '
+                f'p99 {result["p99_ms"]:8.2f} ms  '
+                f'errors {result["error_rate"]:6.2%}  '
+                f'queries {result.get("queries_per_request", "-")}'
+            )
+        report = {
+            'vendor': connection.vendor,
+            'mode': options['mode'],
+            'workers': options['workers'],
+            'concurrency': options['concurrency'],
+            'duration': options['duration'],
+            'weights': weights,
+            'scenarios': results,
+        }
+        with open(options['report'], 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        self.stdout.write(f'Отчет сохранен в {options["report"]}')
+
+    def run_on_test_db(self, weights, options):
+        setup_test_environment()
+        with tempfile.TemporaryDirectory() as directory:
+            # Сервер работает в других процессах, поэтому тестовая
+            # SQLite должна быть файлом, а не базой в памяти.
+            if connection.vendor == 'sqlite':
+                connection.settings_dict['TEST']['NAME'] = os.path.join(
+                    directory, 'load_test.sqlite3')
+            old_name = connection.creation.create_test_db(
+                verbosity=0, autoclobber=True)
+            try:
+                with override_settings(PASSWORD_HASHERS=[
+                        'django.contrib.auth.hashers.MD5PasswordHasher']):
+                    seed(users=options['users'], recipes=options['recipes'])
+                    return self.run(weights, options)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                teardown_test_environment()
+
+    def run(self, weights, options):
+        data = fixtures(options['concurrency'])
+        tokens = data['tokens']
+        with loadtest.Server(options['mode'],
+                             workers=options['workers']) as server:
+            clients = [
+                Client(server.port, tokens[number % len(tokens)], weights,
+                       data, options['seed'] + number)
+                for number in range(options['concurrency'])
+            ]
+            return loadtest.run_clients(
+                clients, options['duration'], total=TOTAL)
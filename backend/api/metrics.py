@@ -0,0 +1,154 @@
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+""" Замеры запросов: время в БД, сериализации и во view по маршрутам."""
+
+# Границы корзин гистограмм: секунды и число SQL-запросов.
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+QUERIES_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+HISTOGRAMS = (
+    ('request_duration_seconds', 'total', SECONDS_BUCKETS,
+     'Время обработки запроса.'),
+    ('db_duration_seconds', 'db', SECONDS_BUCKETS,
+     'Время SQL-запросов за один запрос API.'),
+    ('serializer_duration_seconds', 'serializer', SECONDS_BUCKETS,
+     'Время рендеринга ответа в JSON.'),
+    ('db_queries', 'queries', QUERIES_BUCKETS,
+     'Число SQL-запросов за один запрос API.'),
+)
+
+current = ContextVar('request_timings', default=None)
+
+
+class Timings:
+    """ Замеры одного запроса."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.serializer = 0.0
+        self.total = 0.0
+
+    def query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db += time.perf_counter() - start
+
+    def server_timing(self):
+        return ', '.join((
+            f'db;dur={self.db * 1000:.1f};desc="{self.queries} queries"',
+            f'serializer;dur={self.serializer * 1000:.1f}',
+            f'total;dur={self.total * 1000:.1f}',
+        ))
+
+
+class Histogram:
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[position] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield bound, total
+        yield '+Inf', self.count
+
+
+class Registry:
+    """ Гистограммы по (маршрут, метод) в памяти процесса.
+
+        Каждый воркер считает свои запросы, поэтому Prometheus нужно
+        опрашивать каждый воркер или суммировать ряды по instance.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def observe(self, route, method, timings):
+        with self._lock:
+            histograms = self._routes.get((route, method))
+            if histograms is None:
+                histograms = self._routes[route, method] = {
+                    attr: Histogram(buckets)
+                    for name, attr, buckets, help_text in HISTOGRAMS}
+            for attr, histogram in histograms.items():
+                histogram.observe(getattr(timings, attr))
+
+    def clear(self):
+        with self._lock:
+            self._routes.clear()
+
+    def render(self, prefix='foodgram_'):
+        """ Текстовый формат Prometheus 0.0.4."""
+        with self._lock:
+            lines = []
+            for name, attr, buckets, help_text in HISTOGRAMS:
+                name = prefix + name
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for (route, method), histograms in sorted(
+                        self._routes.items()):
+                    histogram = histograms[attr]
+                    labels = f'route="{route}",method="{method}"'
+                    for bound, count in histogram.cumulative():
+                        lines.append(
+                            f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+                    lines.append(f'{name}_sum{{{labels}}} {histogram.sum}')
+                    lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def sample_rate():
+    return getattr(settings, 'METRICS_SAMPLE_RATE', 1.0)
+
+
+def sampled():
+    rate = sample_rate()
+    return rate >= 1 or random.random() < rate
+
+
+def route_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else 'unmatched'
+
+
+def record_query(execute, sql, params, many, context):
+    """ Обертка execute всех подключений: считает запросы, если текущий
+        запрос попал в выборку. Контекст переходит и в потоки
+        sync_to_async, поэтому замеры работают и под ASGI. """
+    timings = current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    return timings.query(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def instrument_connection(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
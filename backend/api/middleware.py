@@ -0,0 +1,114 @@
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.utils.deprecation import MiddlewareMixin
+
+from rest_framework.permissions import SAFE_METHODS
+
+from . import metrics, replicas
+
+""" Middleware API. Оба класса работают и под WSGI, и под ASGI: в
+    асинхронной цепочке они не переводят запрос в отдельный поток."""
+
+
+class MetricsMiddleware(MiddlewareMixin):
+    """ Замеряет долю запросов (METRICS_SAMPLE_RATE): число и время
+        SQL-запросов, время рендеринга ответа и всего запроса.
+
+        Замеры уходят в заголовок Server-Timing и в гистограммы
+        metrics.registry. Запросы вне выборки проходят без оберток.
+    """
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if not metrics.sampled():
+            return self.get_response(request)
+        timings, token = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.current.reset(token)
+        return self.finish(request, response, timings)
+
+    async def __acall__(self, request):
+        if not metrics.sampled():
+            return await self.get_response(request)
+        timings, token = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.current.reset(token)
+        return self.finish(request, response, timings)
+
+    def process_template_response(self, request, response):
+        # Ответ DRF рендерится сразу после этого хука; время до
+        # post-render callback и есть время сериализации ответа.
+        timings = metrics.current.get()
+        if timings is not None:
+            start = time.perf_counter()
+
+            def rendered(response):
+                timings.serializer += time.perf_counter() - start
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def start(self):
+        timings = metrics.Timings()
+        timings.total = time.perf_counter()
+        return timings, metrics.current.set(timings)
+
+    def finish(self, request, response, timings):
+        timings.total = time.perf_counter() - timings.total
+        metrics.registry.observe(
+            metrics.route_name(request), request.method, timings)
+        response['Server-Timing'] = timings.server_timing()
+        return response
+
+
+class ReplicaMiddleware(MiddlewareMixin):
+    """ Отправляет чтения GET/HEAD к view с replica_reads = True на
+        реплику из DATABASE_REPLICAS.
+
+        После запроса на запись клиент читает с основной БД еще
+        REPLICA_PIN_SECONDS, чтобы видеть свои изменения.
+    """
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if not replicas.replicas():
+            return self.get_response(request)
+        token = replicas.current.set(replicas.ReadState())
+        try:
+            response = self.get_response(request)
+        finally:
+            replicas.current.reset(token)
+        if request.method not in SAFE_METHODS:
+            replicas.pin(request)
+        return response
+
+    async def __acall__(self, request):
+        if not replicas.replicas():
+            return await self.get_response(request)
+        token = replicas.current.set(replicas.ReadState())
+        try:
+            response = await self.get_response(request)
+        finally:
+            replicas.current.reset(token)
+        if request.method not in SAFE_METHODS:
+            await sync_to_async(replicas.pin)(request)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Под ASGI метод выполняется в другом потоке, поэтому реплика
+        # записывается в общий для запроса ReadState, а не в ContextVar.
+        state = replicas.current.get()
+        view_class = getattr(view_func, 'cls', None)
+        if (state is not None
+                and request.method in ('GET', 'HEAD')
+                and getattr(view_class, 'replica_reads', False)
+                and not replicas.is_pinned(request)):
+            state.alias = replicas.choose_replica()
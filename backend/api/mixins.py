@@ -1,4 +1,27 @@
-from rest_framework import mixins, viewsets
+import calendar
+import hashlib
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection, transaction
+from django.db.models import Aggregate, CharField, Count, Max, Q
+from django.db.models.functions import Cast
+from django.http import Http404
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+
+from rest_framework import mixins, status, viewsets
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from recipes import counters
+from recipes.models import Recipe
+from users.models import User
+from . import list_cache
+from .replicas import primary
+from .serializers import BulkIdsSerializer
+from .tag_cache import get_version as get_tags_version
+from .tag_cache import tag_cache
 
 
 class CreateDeleteListViewSet(mixins.CreateModelMixin,
@@ -7,3 +30,305 @@ class CreateDeleteListViewSet(mixins.CreateModelMixin,
                               viewsets.GenericViewSet
                               ):
     pass
+
+
+class BulkRelationViewSet(viewsets.ViewSet):
+    '''
+    Массовое добавление и удаление связей пользователя (избранное,
+    корзина, подписки): POST {"add": [id, ...], "remove": [id, ...]}.
+
+    Число запросов не зависит от размера пачки: блокировка строки
+    пользователя, одна выборка существующих связей, одна проверка id,
+    один bulk_create и один DELETE. Сигналы моделей обходятся, поэтому
+    счетчики обновляются здесь же одним UPDATE на пачку.
+    '''
+
+    permission_classes = [IsAuthenticated]
+    model = None
+    field = None
+    target_model = None
+
+    def get_forbidden(self, user, ids):
+        return set()
+
+    def rows_added(self, user, ids):
+        counters.added(self.model, ids)
+
+    def rows_removed(self, user, ids):
+        counters.removed(self.model, ids)
+
+    def delete_rows(self, user, ids):
+        """ DELETE одним запросом, без выборки и сигналов post_delete."""
+        meta = self.model._meta
+        placeholders = ', '.join(['%s'] * len(ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {meta.db_table} '
+                f'WHERE {meta.get_field("user").column} = %s '
+                f'AND {meta.get_field(self.field).column} '
+                f'IN ({placeholders})',
+                (user.pk, *ids))
+
+    def create(self, request):
+        serializer = BulkIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        add = serializer.validated_data['add']
+        remove = serializer.validated_data['remove']
+        user = request.user
+        rows = self.model.objects.filter(user=user)
+        target = f'{self.field}_id'
+        with transaction.atomic():
+            # Параллельные запросы того же пользователя видели бы одни
+            # и те же existing и оба считали бы вставку своей: счетчики
+            # и списки покупок выросли бы дважды.
+            list(User.objects.select_for_update().filter(
+                pk=user.pk).values_list('pk', flat=True))
+            existing = set(rows.filter(
+                **{f'{self.field}__in': add + remove}
+            ).values_list(target, flat=True))
+            forbidden = self.get_forbidden(user, add)
+            candidates = [
+                pk for pk in add if pk not in existing | forbidden]
+            found = set(self.target_model.objects.filter(
+                id__in=candidates).values_list('id', flat=True)
+            ) if candidates else set()
+            created = [pk for pk in candidates if pk in found]
+            deleted = [pk for pk in remove if pk in existing]
+            if created:
+                self.model.objects.bulk_create(
+                    [self.model(user=user, **{target: pk})
+                     for pk in created],
+                    ignore_conflicts=True)
+                self.rows_added(user, created)
+            if deleted:
+                self.delete_rows(user, deleted)
+                self.rows_removed(user, deleted)
+        return Response({
+            'add': [
+                {'id': pk, 'status': (
+                    'exists' if pk in existing
+                    else 'forbidden' if pk in forbidden
+                    else 'created' if pk in found
+                    else 'not_found')}
+                for pk in add
+            ],
+            'remove': [
+                {'id': pk,
+                 'status': 'deleted' if pk in existing else 'not_found'}
+                for pk in remove
+            ],
+        })
+
+
+class AsyncToggleView(APIView):
+    '''
+    async-view добавления (POST) и удаления (DELETE) связи
+    пользователя с объектом из URL: избранное, корзина, подписки.
+
+    ORM в Django 3.2 синхронный, поэтому весь dispatch APIView -
+    аутентификация, права, троттлинг, выбор формата и обработка
+    ошибок - идет одним переходом в поток через sync_to_async.
+    Под ASGI чтение запроса и отправка ответа остаются в event loop,
+    и медленный клиент не занимает поток.
+    '''
+
+    permission_classes = [IsAuthenticated]
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = sync_to_async(
+            super().as_view(**initkwargs), thread_sensitive=True)
+
+        async def async_view(request, *args, **kwargs):
+            return await view(request, *args, **kwargs)
+        # csrf_exempt обернул бы view в синхронную функцию.
+        async_view.csrf_exempt = True
+        async_view.cls = cls
+        async_view.initkwargs = initkwargs
+        return async_view
+
+
+class ConcatIds(Aggregate):
+    """ id строк через запятую в произвольном порядке: GROUP_CONCAT
+        на SQLite, STRING_AGG на PostgreSQL. """
+
+    function = 'GROUP_CONCAT'
+    output_field = CharField()
+
+    def __init__(self, field, **extra):
+        super().__init__(Cast(field, CharField()), **extra)
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        # template задается атрибутом: Aggregate.as_sql сам передает
+        # его в Func.as_sql, когда добавляет FILTER.
+        clone = self.copy()
+        clone.function = 'STRING_AGG'
+        clone.template = "%(function)s(%(distinct)s%(expressions)s, ',')"
+        return clone.as_sql(compiler, connection, **extra_context)
+
+
+# Отметки пользователя в агрегате ETag: поле с id и условие.
+USER_FLAGS = {
+    'favorited': ('id', 'is_favorited'),
+    'in_shopping_cart': ('id', 'is_in_shopping_cart'),
+    'subscribed': ('author', 'is_author_subscribed'),
+}
+
+
+def flag_digest(ids):
+    """ Число и хэш упорядоченных id из ConcatIds. Повторы убираются
+        здесь: DISTINCT в агрегате стоил бы сортировки в плане. """
+    ordered = sorted({int(pk) for pk in (ids or '').split(',') if pk})
+    return len(ordered), hashlib.sha1(
+        ','.join(map(str, ordered)).encode()).hexdigest()
+
+
+class ConditionalRecipeMixin:
+    '''
+    Условный GET для рецептов: ETag и Last-Modified считаются одним
+    агрегирующим запросом вместе с отметками пользователя, и при
+    совпадении ответ 304 отдается до сериализации.
+
+    Last-Modified ставится только для одного рецепта: удаление
+    рецепта из списка не сдвигает максимум updated.
+    '''
+
+    def get_validators(self, request, queryset):
+        fields = {
+            'last_modified': Max('updated'),
+            'total': Count('id'),
+        }
+        user = request.user
+        if user.is_authenticated:
+            fields.update({
+                name: ConcatIds(field, filter=Q(**{flag: True}))
+                for name, (field, flag) in USER_FLAGS.items()
+            })
+        state = queryset.order_by().aggregate(**fields)
+        queryset.known_count = state['total']
+        if not state['total']:
+            return None, None
+        for name in USER_FLAGS:
+            if name in state:
+                state[name] = flag_digest(state[name])
+        key = '|'.join(str(value) for value in (
+            request.get_full_path(), user.id, get_tags_version(),
+            *sorted(state.items()),
+        ))
+        etag = 'W/"{}"'.format(hashlib.sha1(key.encode()).hexdigest())
+        return etag, state['last_modified'].replace(microsecond=0)
+
+    def not_modified(self, request, etag, last_modified):
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            return etag in parse_etags(if_none_match)
+        # Last-Modified не учитывает избранное и корзину пользователя.
+        if last_modified is None or request.user.is_authenticated:
+            return False
+        if_modified_since = parse_http_date_safe(
+            request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        return (if_modified_since is not None
+                and calendar.timegm(last_modified.utctimetuple())
+                <= if_modified_since)
+
+    def conditional(self, request, queryset, build_response):
+        etag, last_modified = self.get_validators(request, queryset)
+        return self.respond(request, etag, last_modified, build_response)
+
+    def respond(self, request, etag, last_modified, build_response):
+        if etag is None:
+            return build_response()
+        headers = {'ETag': etag}
+        if last_modified is not None:
+            headers['Last-Modified'] = http_date(
+                calendar.timegm(last_modified.utctimetuple()))
+        if self.not_modified(request, etag, last_modified):
+            return Response(
+                status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        response = build_response()
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+
+        def build_response():
+            page = self.paginate_queryset(queryset)
+            if page is not None:
+                serializer = self.get_serializer(page, many=True)
+                return self.get_paginated_response(serializer.data)
+            serializer = self.get_serializer(queryset, many=True)
+            return Response(serializer.data)
+        etag, _ = self.get_validators(request, queryset)
+        return self.respond(request, etag, None, build_response)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup = str(kwargs.get(self.lookup_url_kwarg or self.lookup_field))
+        if not lookup.isdigit():
+            raise Http404
+        queryset = self.get_queryset().filter(id=lookup)
+        return self.conditional(
+            request, queryset,
+            lambda: super(ConditionalRecipeMixin, self).retrieve(
+                request, *args, **kwargs))
+
+
+class CachedRecipeListMixin(ConditionalRecipeMixin):
+    '''
+    Список рецептов из list_cache для запросов с page, tags и author.
+
+    В кэше лежит страница без данных пользователя; тэги берутся
+    из tag_cache, а is_favorited, is_in_shopping_cart и is_subscribed
+    автора для вошедшего пользователя накладываются одним запросом.
+    '''
+
+    def list(self, request, *args, **kwargs):
+        key = list_cache.page_key(request)
+        if key is None:
+            return super().list(request, *args, **kwargs)
+        page = list_cache.get_page(key)
+        if page is None:
+            # Страница общая для всех процессов, поэтому собирается
+            # с основной БД, а не с реплики этого запроса.
+            with primary():
+                page = self.build_page(request)
+            list_cache.set_page(key, page)
+        data = page['data']
+        tags = tag_cache.snapshot()['by_id']
+        for recipe in data['results']:
+            recipe['tags'] = [tags[tag['id']] for tag in recipe['tags']
+                              if tag['id'] in tags]
+        flags = self.overlay_user_flags(request.user, data['results'])
+        etag = None
+        if data['count']:
+            validator = '|'.join(str(value) for value in (
+                key, get_tags_version(), request.user.id, flags))
+            etag = 'W/"{}"'.format(
+                hashlib.sha1(validator.encode()).hexdigest())
+        return self.respond(request, etag, None, lambda: Response(data))
+
+    def build_page(self, request):
+        queryset = self.filter_queryset(
+            Recipe.objects.with_related().with_user_flags(
+                AnonymousUser()).order_by('-id'))
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return {'data': self.get_paginated_response(serializer.data).data}
+
+    def overlay_user_flags(self, user, recipes):
+        if user.is_anonymous or not recipes:
+            return ()
+        flags = list(Recipe.objects.filter(
+            id__in=[recipe['id'] for recipe in recipes]
+        ).with_user_flags(user).values_list(
+            'id', 'is_favorited', 'is_in_shopping_cart',
+            'is_author_subscribed').order_by('id'))
+        by_id = {row[0]: row[1:] for row in flags}
+        for recipe in recipes:
+            favorited, in_cart, subscribed = by_id.get(
+                recipe['id'], (False, False, False))
+            recipe['is_favorited'] = favorited
+            recipe['is_in_shopping_cart'] = in_cart
+            recipe['author']['is_subscribed'] = subscribed
+        return flags
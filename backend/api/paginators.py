@@ -1,5 +1,35 @@
-from rest_framework.pagination import PageNumberPagination
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 
 class SubscribtionPagintation(PageNumberPagination):
     page_size = 6
+
+
+class KnownCountPaginator(Paginator):
+    """ Берет число объектов из known_count, если его уже посчитали."""
+
+    @cached_property
+    def count(self):
+        known_count = getattr(self.object_list, 'known_count', None)
+        if known_count is not None:
+            return known_count
+        return super().count
+
+
+class RecipePagination(PageNumberPagination):
+    django_paginator_class = KnownCountPaginator
+
+
+class RecipeCursorPagination(CursorPagination):
+    """ Keyset-пагинация по -id: без COUNT(*) и OFFSET,
+        курсоры не съезжают при добавлении новых рецептов."""
+
+    ordering = '-id'
+
+    @staticmethod
+    def is_requested(request):
+        return (request.query_params.get('pagination') == 'cursor'
+                or 'cursor' in request.query_params)
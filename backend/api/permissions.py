@@ -26,3 +26,12 @@ class AuthorOrAuthenticated(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         return (request.method in permissions.SAFE_METHODS
                 or obj.author == request.user)
+
+
+class IsAdmin(permissions.BasePermission):
+    '''
+    Доступ только админу и суперюзеру.
+    '''
+
+    def has_permission(self, request, view):
+        return request.user.is_authenticated and request.user.is_admin
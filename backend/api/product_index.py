@@ -0,0 +1,93 @@
+import bisect
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from recipes.models import Product
+from .replicas import primary
+
+""" Индекс продуктов в памяти процесса для автодополнения ингредиентов."""
+
+VERSION_KEY = 'products:version'
+
+
+def normalize(value):
+    return value.strip().lower().replace('ё', 'е')
+
+
+def get_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_version():
+    """ Сбрасывает индекс во всех процессах сразу."""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+class ProductIndex:
+    """ Отсортированный по нормализованному имени список продуктов.
+
+        Строится лениво и пересобирается, когда номер версии в кэше
+        расходится с локальным. Поиск по префиксу - бинарный поиск,
+        затем добираются совпадения по подстроке.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._keys = None
+        self._products = None
+
+    def _load(self):
+        version = get_version()
+        with self._lock:
+            if self._version != version:
+                with primary():
+                    rows = sorted(
+                        (normalize(name), name, pk, unit)
+                        for pk, name, unit in Product.objects.values_list(
+                            'id', 'name', 'measurement_unit')
+                    )
+                self._products = [
+                    {'id': pk, 'name': name, 'measurement_unit': unit}
+                    for _, name, pk, unit in rows
+                ]
+                self._keys = [key for key, *_ in rows]
+                self._version = version
+            return self._keys, self._products
+
+    def search(self, query='', limit=None):
+        keys, products = self._load()
+        query = normalize(query)
+        if not query:
+            return products[:limit]
+        start = bisect.bisect_left(keys, query)
+        end = bisect.bisect_left(keys, query + '\uffff', lo=start)
+        result = products[start:end]
+        if limit is not None and len(result) >= limit:
+            return result[:limit]
+        result = result + [
+            products[position] for position, key in enumerate(keys)
+            if query in key and not key.startswith(query)
+        ]
+        return result[:limit]
+
+
+product_index = ProductIndex()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_index(**kwargs):
+    transaction.on_commit(bump_version)
@@ -0,0 +1,85 @@
+import hashlib
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+""" Чтение с реплик БД для безопасных запросов к API."""
+
+CACHE_PREFIX = 'db:pinned:'
+# Модели, которые всегда читаются с основной БД: новый токен должен
+# работать сразу после входа, даже если реплика отстает.
+PRIMARY_APPS = ('authtoken', 'sessions')
+
+current = ContextVar('read_state', default=None)
+
+
+class ReadState:
+    """ Алиас БД для чтений текущего запроса; None - основная БД."""
+
+    alias = None
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def pin_seconds():
+    return getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+
+
+def credentials(request):
+    """ Ключ клиента для read-your-writes: токен или сессия."""
+    value = (request.META.get('HTTP_AUTHORIZATION')
+             or request.COOKIES.get(settings.SESSION_COOKIE_NAME))
+    if not value:
+        return None
+    return CACHE_PREFIX + hashlib.sha256(value.encode()).hexdigest()
+
+
+def pin(request):
+    """ Направляет чтения клиента на основную БД на REPLICA_PIN_SECONDS."""
+    key = credentials(request)
+    if key is not None:
+        cache.set(key, True, timeout=pin_seconds())
+
+
+def is_pinned(request):
+    key = credentials(request)
+    return key is not None and cache.get(key) is not None
+
+
+@contextmanager
+def primary():
+    """ Чтения внутри блока идут в основную БД: общие кэши нельзя
+        собирать с отстающей реплики. """
+    token = current.set(None)
+    try:
+        yield
+    finally:
+        current.reset(token)
+
+
+def choose_replica():
+    aliases = replicas()
+    return random.choice(aliases) if aliases else None
+
+
+class ReplicaRouter:
+    """ Чтения идут в алиас, выбранный ReplicaMiddleware для текущего
+        запроса, записи - всегда в основную БД. """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in PRIMARY_APPS:
+            return DEFAULT_DB_ALIAS
+        state = current.get()
+        return state.alias if state is not None else None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
@@ -1,23 +1,31 @@
 import django.contrib.auth.password_validation as validators
 from django.contrib.auth import authenticate, get_user_model
 from django.contrib.auth.hashers import make_password
-from django.shortcuts import get_object_or_404
+from django.db import transaction
 
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
-from .services import create_ingredients_amount
+from .services import create_ingredients_amount, update_ingredients_amount
+from .tag_cache import tag_cache
+from recipes import images, shopping_list
 from recipes.models import (Favorite, Ingredient, Product, Recipe,
                             ShoppingCart, Subscribe, Tag)
 
 User = get_user_model()
 
+RECIPES_LIMIT = 3
+BULK_LIMIT = 500
+
 
 class UserSerializer(serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField(read_only=True)
 
     def get_is_subscribed(self, instance):
+        subscribed = getattr(instance, 'is_followed', None)
+        if subscribed is not None:
+            return subscribed
         if not self.context:
             return False
         request_user = self.context.get('request').user.id
@@ -109,7 +117,7 @@ class UserPasswordSerializer(serializers.Serializer):
         password = make_password(
             validated_data.get('new_password'))
         user.password = password
-        user.save()
+        user.save(update_fields=['password'])
         return validated_data
 
 
@@ -125,6 +133,28 @@ class SubscribeSerializer(serializers.ModelSerializer):
         fields = ('id', 'user', 'author')
 
 
+class BulkIdsSerializer(serializers.Serializer):
+    add = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        max_length=BULK_LIMIT,
+        default=list)
+    remove = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        max_length=BULK_LIMIT,
+        default=list)
+
+    def validate(self, data):
+        add = list(dict.fromkeys(data['add']))
+        remove = list(dict.fromkeys(data['remove']))
+        if not add and not remove:
+            raise ValidationError('Передайте id в add или remove!')
+        both = set(add) & set(remove)
+        if both:
+            raise ValidationError(
+                f'id {sorted(both)} одновременно в add и remove!')
+        return {'add': add, 'remove': remove}
+
+
 class ProductSerializer(serializers.ModelSerializer):
 
     class Meta:
@@ -180,9 +210,24 @@ class TagsSerializer(serializers.ModelSerializer):
             'id', 'name', 'color', 'slug',)
 
 
+class ImageVariantField(serializers.ImageField):
+    """ URL миниатюры рецепта; пока она не собрана - URL оригинала."""
+
+    def __init__(self, variant, **kwargs):
+        self.variant = variant
+        kwargs.update(source='*', read_only=True)
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        return super().to_representation(
+            recipe.get_image_variant(self.variant))
+
+
 class RecipeListSerializer(serializers.ModelSerializer):
 
     image = Base64ImageField()
+    thumbnail = ImageVariantField('image_thumbnail')
+    thumbnail_webp = ImageVariantField('image_thumbnail_webp')
     author = UserSerializer(read_only=True)
     tags = TagsSerializer(
         read_only=True,
@@ -198,28 +243,41 @@ class RecipeListSerializer(serializers.ModelSerializer):
         return IngredientListSerializer(queryset, many=True).data
 
     def get_is_favorited(self, instance):
+        if hasattr(instance, 'is_favorited'):
+            return instance.is_favorited
         request_user = self.context.get('request').user.id
         return Favorite.objects.filter(
             user=request_user, recipe=instance.id).exists()
 
     def get_is_in_shopping_cart(self, instance):
+        if hasattr(instance, 'is_in_shopping_cart'):
+            return instance.is_in_shopping_cart
         request_user = self.context.get('request').user.id
         return ShoppingCart.objects.filter(
             user=request_user, recipe=instance.id).exists()
 
+    def to_representation(self, instance):
+        if hasattr(instance, 'is_author_subscribed'):
+            instance.author.is_followed = instance.is_author_subscribed
+        return super().to_representation(instance)
+
     class Meta:
         model = Recipe
         fields = ('id', 'author', 'is_favorited',
                   'is_in_shopping_cart', 'name',
-                  'image', 'text', 'tags',
+                  'image', 'thumbnail', 'thumbnail_webp', 'text', 'tags',
                   'ingredients', 'cooking_time')
 
 
 class OneRecipeListSerializer(serializers.ModelSerializer):
 
+    thumbnail = ImageVariantField('image_thumbnail')
+    thumbnail_webp = ImageVariantField('image_thumbnail_webp')
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'thumbnail',
+                  'thumbnail_webp', 'cooking_time')
 
 
 class RecipeSerializer(serializers.ModelSerializer):
@@ -227,10 +285,9 @@ class RecipeSerializer(serializers.ModelSerializer):
     image = Base64ImageField(
         max_length=None,
         use_url=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        many=True,
-        required=True,
-        queryset=Tag.objects.all())
+    tags = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=True)
     ingredients = IngredientsEditSerializer(
         many=True,
         required=True)
@@ -238,18 +295,25 @@ class RecipeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Recipe
         fields = '__all__'
-        read_only_fields = ('author',)
+        read_only_fields = ('author', 'image_thumbnail',
+                            'image_thumbnail_webp', 'image_variants_source',
+                            'favorites_count', 'in_carts_count')
 
-    def validate(self, data):
-        tags = data['tags']
+    def validate_tags(self, tags):
         if not tags:
             raise serializers.ValidationError(
                 'Нужен хотя бы один тэг для рецепта!')
-        for tag_name in tags:
-            if not Tag.objects.filter(name=tag_name).exists():
-                raise serializers.ValidationError(
-                    f'Тэга {tag_name} не существует!')
-        return data
+        # Кэш мог еще не узнать о тэге, созданном в другом процессе.
+        missing = [tag_id for tag_id in tags
+                   if not tag_cache.is_known(tag_id)]
+        if missing:
+            found = set(Tag.objects.filter(
+                id__in=missing).values_list('id', flat=True))
+            for tag_id in missing:
+                if tag_id not in found:
+                    raise serializers.ValidationError(
+                        f'Тэга {tag_id} не существует!')
+        return list(dict.fromkeys(tags))
 
     def validate_cooking_time(self, cooking_time):
         if int(cooking_time) < 1:
@@ -258,72 +322,86 @@ class RecipeSerializer(serializers.ModelSerializer):
         return cooking_time
 
     def validate_ingredients(self, ingredients):
-        ingredient_list = []
-        print(f'ingrediends = {ingredients}')
+        product_ids = set()
         for items in ingredients:
-            amount = items['amount']
-            if int(amount) <= 0:
+            if int(items['amount']) <= 0:
                 raise serializers.ValidationError(
                     'Минимальное величина ингридиентов не может = 0')
-            ingredient = get_object_or_404(
-                Product, id=items['id'])
-            if ingredient in ingredient_list:
+            if items['id'] in product_ids:
                 raise serializers.ValidationError(
                     'Ингредиент должен быть уникальным!')
-            ingredient_list.append(ingredient)
+            product_ids.add(items['id'])
+        products = Product.objects.in_bulk(product_ids)
+        missing = product_ids - products.keys()
+        if missing:
+            raise serializers.ValidationError(
+                f'Ингредиентов {sorted(missing)} не существует!')
+        for items in ingredients:
+            items['product'] = products[items['id']]
         return ingredients
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         recipe = Recipe.objects.create(**validated_data)
         recipe.tags.set(tags)
-        create_ingredients_amount(self, ingredients, recipe)
+        create_ingredients_amount(ingredients, recipe)
+        images.enqueue(recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         if 'ingredients' in validated_data:
-            ingredients = validated_data.pop('ingredients')
-            instance.ingredients.clear()
-            create_ingredients_amount(self, ingredients, instance)
+            shopping_list.change_for_recipe(instance.id, -1)
+            update_ingredients_amount(
+                validated_data.pop('ingredients'), instance)
+            shopping_list.change_for_recipe(instance.id, 1)
         if 'tags' in validated_data:
             instance.tags.set(
                 validated_data.pop('tags'))
-        return super().update(
-            instance, validated_data)
+        recipe = super().update(instance, validated_data)
+        if 'image' in validated_data:
+            images.enqueue(recipe)
+        return recipe
 
     def to_representation(self, instance):
+        request = self.context.get('request')
+        instance = Recipe.objects.with_related().with_user_flags(
+            request.user).get(pk=instance.pk)
         return RecipeListSerializer(
             instance,
             context={
-                'request': self.context.get('request')
+                'request': request
             }).data
 
 
 class RecipesShortSerializer(serializers.ModelSerializer):
 
+    thumbnail = ImageVariantField('image_thumbnail')
+    thumbnail_webp = ImageVariantField('image_thumbnail_webp')
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'thumbnail',
+                  'thumbnail_webp', 'cooking_time')
 
 
 class SubscriptionsSerializer(UserSerializer):
     recipes = serializers.SerializerMethodField(read_only=True)
-    recipes_count = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
         model = User
         fields = ('email', 'id', 'username', 'first_name',
                   'last_name', 'is_subscribed', 'recipes', 'recipes_count')
+        read_only_fields = ('recipes_count',)
 
     def get_recipes(self, obj):
-        print(f'obiekt - {obj}')
-        recipes = (
-            obj.recipes.all()[:int(3)])
-        print(f'recept - {recipes}')
+        if hasattr(obj, 'recipes_preview'):
+            recipes = obj.recipes_preview
+        else:
+            recipes = obj.recipes.order_by('-id')[
+                :self.context.get('recipes_limit', RECIPES_LIMIT)]
         return RecipesShortSerializer(
             recipes,
             many=True).data
-
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
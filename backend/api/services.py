@@ -1,36 +1,127 @@
-from django.shortcuts import get_object_or_404
-
-from recipes.models import Ingredient, Product, Recipe
-
-
-def get_recipe_ingredients_txt(shop_cart):
-    """ Создает список покупок основанный
-        из списка рецептов вашей корзины """
-    text = "Ингредиенты: \n"
-    ingredients_dict = {}
-    for cart in shop_cart:
-        recipe = Recipe.objects.get(id=cart.recipe.id)
-        ingredients = Ingredient.objects.filter(recipe=recipe)
-        for ingredient in ingredients:
-            if ingredient.product_id in ingredients_dict:
-                ingredients_dict[ingredient.product_id] += ingredient.amount
-            else:
-                ingredients_dict[ingredient.product_id] = ingredient.amount
-    for product in ingredients_dict:
-        product_ = ingredients_dict[product]
-        text += (
-            f"{product.name} - {str(product_)} {product.measurement_unit}. \n")
-    return text
-
-
-def create_ingredients_amount(self, ingredients_data, recipe):
+import csv
+import json
+from collections import defaultdict
+
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from recipes.models import Ingredient, Recipe, ShoppingListItem
+
+
+class Echo:
+    """ Псевдо-файл для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def get_shopping_list(user):
+    """ Готовые итоги списка покупок из ShoppingListItem."""
+    return (
+        ShoppingListItem.objects
+        .filter(user=user, total__gt=0)
+        .values('total',
+                name=F('product__name'),
+                measurement_unit=F('product__measurement_unit'))
+        .order_by('product__name')
+    )
+
+
+def render_shopping_list_txt(rows):
+    yield "Ингредиенты: \n"
+    for item in rows:
+        yield (
+            f"{item['name']} - {item['total']} "
+            f"{item['measurement_unit']}. \n")
+
+
+def render_shopping_list_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(['Ингредиент', 'Количество', 'Единица измерения'])
+    for item in rows:
+        yield writer.writerow([
+            item['name'],
+            item['total'],
+            item['measurement_unit'],
+        ])
+
+
+def render_shopping_list_json(rows):
+    yield '['
+    separator = ''
+    for item in rows:
+        yield separator + json.dumps({
+            'name': item['name'],
+            'amount': item['total'],
+            'measurement_unit': item['measurement_unit'],
+        }, ensure_ascii=False)
+        separator = ', '
+    yield ']'
+
+
+SHOPPING_LIST_FORMATS = {
+    'txt': (render_shopping_list_txt, 'text/plain; charset=utf-8'),
+    'csv': (render_shopping_list_csv, 'text/csv; charset=utf-8'),
+    'json': (render_shopping_list_json, 'application/json'),
+}
+
+
+def get_recipes_preview(author_ids, limit):
+    """ Последние limit рецептов каждого автора одним запросом
+        с ROW_NUMBER() по автору. """
+    previews = defaultdict(list)
+    if not author_ids:
+        return previews
+    ranked = Recipe.objects.filter(author__in=author_ids).annotate(
+        row_number=Window(
+            expression=RowNumber(),
+            partition_by=[F('author')],
+            order_by=F('id').desc(),
+        )
+    )
+    sql, params = ranked.query.sql_with_params()
+    recipes = Recipe.objects.raw(
+        f'SELECT * FROM ({sql}) ranked WHERE row_number <= %s '
+        'ORDER BY author_id, row_number',
+        (*params, limit),
+    )
+    for recipe in recipes:
+        previews[recipe.author_id].append(recipe)
+    return previews
+
+
+def create_ingredients_amount(ingredients_data, recipe):
     Ingredient.objects.bulk_create(
             [Ingredient(
-                product_id=get_object_or_404(
-                    Product,
-                    id=ingredient_item.get('id')
-                ),
+                product_id=ingredient_item['product'],
                 recipe=recipe,
-                amount=ingredient_item.get('amount')
+                amount=ingredient_item['amount']
             ) for ingredient_item in ingredients_data]
     )
+
+
+def update_ingredients_amount(ingredients_data, recipe):
+    """ Сравнивает новые ингредиенты с текущими и меняет только разницу:
+        одно удаление, один bulk_update и один bulk_create. """
+    existing = {
+        ingredient.product_id_id: ingredient
+        for ingredient in Ingredient.objects.filter(recipe=recipe)
+    }
+    amounts = {item['id']: item['amount'] for item in ingredients_data}
+    removed = [
+        ingredient.id for product_id, ingredient in existing.items()
+        if product_id not in amounts
+    ]
+    if removed:
+        Ingredient.objects.filter(id__in=removed).delete()
+    changed = []
+    for product_id, amount in amounts.items():
+        ingredient = existing.get(product_id)
+        if ingredient is not None and ingredient.amount != amount:
+            ingredient.amount = amount
+            changed.append(ingredient)
+    if changed:
+        Ingredient.objects.bulk_update(changed, ['amount'])
+    create_ingredients_amount(
+        [item for item in ingredients_data if item['id'] not in existing],
+        recipe)
@@ -0,0 +1,87 @@
+import hashlib
+import json
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from recipes.models import Tag
+from .replicas import primary
+
+""" Кэш тэгов в памяти процесса с общим номером версии в Django cache."""
+
+VERSION_KEY = 'tags:version'
+
+
+def get_version():
+    """ Номер версии; пропавший ключ начинается со времени, а не
+        с единицы, чтобы не совпасть с версией, уже известной
+        процессам. """
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_version():
+    """ Сбрасывает кэш тэгов во всех процессах сразу."""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+class TagCache:
+    """ Сериализованный список тэгов, словарь slug -> id и ETag.
+
+        Данные пересобираются, только когда номер версии в кэше
+        расходится с локальным.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._state = None
+
+    def is_known(self, tag_id):
+        return tag_id in self.snapshot()['by_id']
+
+    def snapshot(self):
+        version = get_version()
+        with self._lock:
+            if self._version != version:
+                with primary():
+                    tags = list(Tag.objects.order_by('id').values(
+                        'id', 'name', 'color', 'slug'))
+                body = json.dumps(tags, ensure_ascii=False, sort_keys=True)
+                self._state = {
+                    'tags': tags,
+                    'by_id': {tag['id']: tag for tag in tags},
+                    'slugs': {tag['slug']: tag['id'] for tag in tags},
+                    'etag': '"{}"'.format(
+                        hashlib.sha1(body.encode()).hexdigest()),
+                }
+                self._version = version
+            return self._state
+
+    def slug_choices(self):
+        return [(slug, slug) for slug in self.snapshot()['slugs']]
+
+    def ids_for_slugs(self, slugs):
+        mapping = self.snapshot()['slugs']
+        return [mapping[slug] for slug in slugs if slug in mapping]
+
+
+tag_cache = TagCache()
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tag_cache(**kwargs):
+    # До коммита другой процесс пересобрал бы кэш из старых строк
+    # и запомнил его под новой версией.
+    transaction.on_commit(bump_version)
@@ -4,25 +4,27 @@ from django.urls import include, path
 from rest_framework import routers
 
 from .views import (AuthToken, DownloadShoppingCartViewSet,
-                    ProductViewSet, RecipeViewSet, FavoriteViewSet,
-                    ShoppingCartViewSet, SubscribeViewSet, TagsViewSet,
-                    UsersViewSet, set_password)
+                    FavoriteBulkViewSet, FavoriteView, ProductViewSet,
+                    RecipeViewSet, ShoppingCartBulkViewSet, ShoppingCartView,
+                    SubscribeBulkViewSet, SubscribeView, TagsViewSet,
+                    UsersViewSet, metrics_view, set_password,
+                    token_cache_stats)
 
 app_name = 'api'
 
 router = routers.DefaultRouter()
 router.register('tags', TagsViewSet)
 router.register(
-    r'users/(?P<author_id>\d+)/subscribe',
-    SubscribeViewSet, basename='SubscribeList'
+    r'users/subscribe/bulk',
+    SubscribeBulkViewSet, basename='SubscribeBulk'
 )
 router.register(
-    r'recipes/(?P<recipe_id>\d+)/favorite',
-    FavoriteViewSet, basename='FavoriteList'
+    r'recipes/favorite/bulk',
+    FavoriteBulkViewSet, basename='FavoriteBulk'
 )
 router.register(
-    r'recipes/(?P<recipe_id>\d+)/shopping_cart',
-    ShoppingCartViewSet, basename='ShoppingCartList'
+    r'recipes/shopping_cart/bulk',
+    ShoppingCartBulkViewSet, basename='ShoppingCartBulk'
 )
 router.register(
     r'recipes/download_shopping_cart',
@@ -41,6 +43,26 @@ urlpatterns = [
         'users/set_password/',
         set_password,
         name='set_password'),
+    path(
+        'auth/token/stats/',
+        token_cache_stats,
+        name='token_cache_stats'),
+    path(
+        'metrics/',
+        metrics_view,
+        name='metrics'),
+    path(
+        'users/<int:author_id>/subscribe/',
+        SubscribeView.as_view(),
+        name='subscribe'),
+    path(
+        'recipes/<int:recipe_id>/favorite/',
+        FavoriteView.as_view(),
+        name='favorite'),
+    path(
+        'recipes/<int:recipe_id>/shopping_cart/',
+        ShoppingCartView.as_view(),
+        name='shopping_cart'),
     path('admin/', admin.site.urls),
     path('', include(router.urls)),
     path('', include('djoser.urls')),
@@ -2,41 +2,61 @@ from djoser.views import UserViewSet
 
 from django.contrib.auth.hashers import make_password
 from django.core.exceptions import ObjectDoesNotExist
+from django.core.handlers.asgi import ASGIRequest
 from django.db import IntegrityError
-from django.http import HttpResponse
+from django.db.models import BooleanField, Value
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.http import parse_etags
 from django_filters.rest_framework import DjangoFilterBackend
 
 from rest_framework import filters, mixins, status, viewsets
 from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
-from rest_framework.decorators import action, api_view
-from rest_framework.exceptions import ValidationError
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.permissions import SAFE_METHODS, AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
 from users.models import User
+from recipes import feed, shopping_list
 from recipes.models import (Favorite, Product, Recipe,
                             ShoppingCart, Subscribe, Tag)
-from .filters import IngredientSearchFilter, RecipeFilter
-from .paginators import SubscribtionPagintation
-from .permissions import AdminOrReadOnly, AuthorOrAuthenticated
-from .serializers import (OneRecipeListSerializer, ProductSerializer,
-                          RecipeListSerializer, RecipeSerializer,
-                          SubscribeSerializer, SubscriptionsSerializer,
-                          TagsSerializer, TokenSerializer,
-                          UserCreateSerializer, UserPasswordSerializer,
-                          UserSerializer)
-from .services import get_recipe_ingredients_txt
-
-
-class FavoriteViewSet(viewsets.ViewSet):
-    """ Избранные рецепты."""
+from . import metrics
+from .authentication import token_cache
+from .filters import RecipeFilter
+from .mixins import (AsyncToggleView, BulkRelationViewSet,
+                     CachedRecipeListMixin)
+from .paginators import (RecipeCursorPagination, RecipePagination,
+                         SubscribtionPagintation)
+from .permissions import AdminOrReadOnly, AuthorOrAuthenticated, IsAdmin
+from .product_index import product_index
+from .serializers import (RECIPES_LIMIT, OneRecipeListSerializer,
+                          ProductSerializer, RecipeListSerializer,
+                          RecipeSerializer, SubscribeSerializer,
+                          SubscriptionsSerializer, TagsSerializer,
+                          TokenSerializer, UserCreateSerializer,
+                          UserPasswordSerializer, UserSerializer)
+from .services import (SHOPPING_LIST_FORMATS, get_recipes_preview,
+                       get_shopping_list)
+from .tag_cache import tag_cache
+
+
+def get_recipes_limit(request):
+    recipes_limit = request.query_params.get('recipes_limit')
+    if recipes_limit is None:
+        return RECIPES_LIMIT
+    if not recipes_limit.isdigit():
+        raise ValidationError(
+            {"errors": "recipes_limit должен быть целым числом"}
+        )
+    return int(recipes_limit)
+
 
-    permission_classes = [IsAuthenticated]
+class FavoriteView(AsyncToggleView):
+    """ Избранные рецепты."""
 
-    def create(self, request, recipe_id):
+    def post(self, request, recipe_id):
         recipe = get_object_or_404(Recipe, id=recipe_id)
         if Favorite.objects.filter(
                 recipe=recipe, user=self.request.user).exists():
@@ -60,13 +80,10 @@ class FavoriteViewSet(viewsets.ViewSet):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class SubscribeViewSet(viewsets.ViewSet):
+class SubscribeView(AsyncToggleView):
     """ Подписки на авторов."""
 
-    permission_classes = [IsAuthenticated]
-    serializer_class = SubscribeSerializer
-
-    def create(self, request, author_id):
+    def post(self, request, author_id):
         author = get_object_or_404(User, id=author_id)
         data = self.request.data.copy()
         data['user'] = request.user.id
@@ -78,7 +95,10 @@ class SubscribeViewSet(viewsets.ViewSet):
                 {"errors": "Вы уже подписаны на автора"}
             )
         Subscribe.objects.create(author=author, user=request.user)
-        serializer = SubscriptionsSerializer(author)
+        author.is_followed = True
+        serializer = SubscriptionsSerializer(
+            author,
+            context={'recipes_limit': get_recipes_limit(request)})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def delete(self, request, author_id):
@@ -98,12 +118,53 @@ class SubscribeViewSet(viewsets.ViewSet):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class ShoppingCartViewSet(viewsets.ViewSet):
-    """ Список покупок."""
+class FavoriteBulkViewSet(BulkRelationViewSet):
+    """ Избранное пачкой."""
+
+    model = Favorite
+    field = 'recipe'
+    target_model = Recipe
+
+
+class SubscribeBulkViewSet(BulkRelationViewSet):
+    """ Подписки пачкой."""
+
+    model = Subscribe
+    field = 'author'
+    target_model = User
+
+    def get_forbidden(self, user, ids):
+        return {user.id}
 
-    permission_classes = [IsAuthenticated]
+    def rows_added(self, user, ids):
+        super().rows_added(user, ids)
+        feed.backfill(user.id, ids)
 
-    def create(self, request, recipe_id):
+    def rows_removed(self, user, ids):
+        super().rows_removed(user, ids)
+        feed.prune(user.id, ids)
+
+
+class ShoppingCartBulkViewSet(BulkRelationViewSet):
+    """ Список покупок пачкой."""
+
+    model = ShoppingCart
+    field = 'recipe'
+    target_model = Recipe
+
+    def rows_added(self, user, ids):
+        super().rows_added(user, ids)
+        shopping_list.change_for_user(user.id, ids, 1)
+
+    def rows_removed(self, user, ids):
+        super().rows_removed(user, ids)
+        shopping_list.change_for_user(user.id, ids, -1)
+
+
+class ShoppingCartView(AsyncToggleView):
+    """ Список покупок."""
+
+    def post(self, request, recipe_id):
         recipe = get_object_or_404(Recipe, id=recipe_id)
         try:
             ShoppingCart.objects.create(recipe=recipe, user=self.request.user)
@@ -128,42 +189,88 @@ class ShoppingCartViewSet(viewsets.ViewSet):
 
 
 class TagsViewSet(viewsets.ModelViewSet):
-    """Список тэгов."""
+    """Список тэгов. Чтение идет из кэша тэгов с поддержкой ETag."""
 
     queryset = Tag.objects.all()
     serializer_class = TagsSerializer
     permission_classes = [AdminOrReadOnly]
     pagination_class = None
+    replica_reads = True
+
+    def cached_response(self, request, data, etag):
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            return Response(
+                status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        return Response(data, headers={'ETag': etag})
+
+    def list(self, request):
+        tags = tag_cache.snapshot()
+        return self.cached_response(request, tags['tags'], tags['etag'])
+
+    def retrieve(self, request, pk=None):
+        tags = tag_cache.snapshot()
+        tag = tags['by_id'].get(int(pk)) if pk.isdigit() else None
+        if tag is None:
+            raise NotFound
+        return self.cached_response(request, tag, tags['etag'])
 
 
 class ProductViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
-    """ Продукты."""
+    """ Продукты. Поиск ?name= идет по индексу в памяти, без БД."""
 
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = [AdminOrReadOnly]
-    filter_backends = (IngredientSearchFilter,)
-    search_fields = ('^name',)
     pagination_class = None
+    replica_reads = True
 
-
-class RecipeViewSet(viewsets.ModelViewSet):
+    def list(self, request):
+        limit = request.query_params.get('limit')
+        if limit is not None:
+            if not limit.isdigit() or int(limit) < 1:
+                raise ValidationError(
+                    {"errors": "limit должен быть положительным числом"}
+                )
+            limit = int(limit)
+        return Response(product_index.search(
+            request.query_params.get('name', ''), limit))
+
+
+class RecipeViewSet(CachedRecipeListMixin, viewsets.ModelViewSet):
     """ Создаем рецепты."""
 
     permission_classes = [AuthorOrAuthenticated]
     lookup_field = 'name'
-    pagination_class = PageNumberPagination
+    replica_reads = True
+    pagination_class = RecipePagination
     filter_backends = (DjangoFilterBackend, )
     filterset_class = RecipeFilter
-    search_fields = ['name']
+
+    @property
+    def cursor_mode(self):
+        return RecipeCursorPagination.is_requested(self.request)
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            self._paginator = (
+                RecipeCursorPagination() if self.cursor_mode
+                else self.pagination_class())
+        return self._paginator
+
+    def list(self, request, *args, **kwargs):
+        if self.cursor_mode:
+            return mixins.ListModelMixin.list(self, request, *args, **kwargs)
+        return super().list(request, *args, **kwargs)
 
     def get_serializer_class(self):
-        if self.action == SAFE_METHODS:
+        if self.request.method in SAFE_METHODS:
             return RecipeListSerializer
         return RecipeSerializer
 
     def get_queryset(self):
-        recipe = Recipe.objects.all().order_by('-id')
+        recipe = Recipe.objects.with_related().with_user_flags(
+            self.request.user).order_by('-id')
         return recipe
 
     def perform_create(self, serializer):
@@ -171,18 +278,49 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     def get_object(self):
         recipe_id = self.kwargs.get('name')
-        recipe = get_object_or_404(Recipe, id=recipe_id)
+        recipe = get_object_or_404(self.get_queryset(), id=recipe_id)
         return recipe
 
+    @action(
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+        pagination_class=RecipeCursorPagination,
+    )
+    def feed(self, request):
+        """Рецепты авторов из подписок, keyset-пагинация по -id."""
+
+        queryset = self.get_queryset().filter(feed_items__user=request.user)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
 
 class DownloadShoppingCartViewSet(viewsets.ViewSet):
+    """ Скачать список покупок в формате txt, csv или json."""
+
+    def perform_content_negotiation(self, request, force=False):
+        # ?format= выбирает формат файла, а не рендерер DRF.
+        return super().perform_content_negotiation(request, force=True)
 
     def list(self, request):
-        author = self.request.user
-        shop_cart = ShoppingCart.objects.filter(user=author.id)
-        text = get_recipe_ingredients_txt(shop_cart)
-        filename = "my-file.txt"
-        response = HttpResponse(text, content_type='text/plain')
+        file_format = request.query_params.get('format', 'txt')
+        if file_format not in SHOPPING_LIST_FORMATS:
+            raise ValidationError(
+                {"errors": "Доступные форматы: "
+                           + ", ".join(SHOPPING_LIST_FORMATS)}
+            )
+        render, content_type = SHOPPING_LIST_FORMATS[file_format]
+        shopping_list = get_shopping_list(self.request.user)
+        # Django 3.2 под ASGI перебирает тело ответа в цикле событий,
+        # где ORM недоступен: строки читаются заранее. Под WSGI
+        # список по-прежнему уходит потоком.
+        if isinstance(request._request, ASGIRequest):
+            rows = list(shopping_list)
+        else:
+            rows = shopping_list.iterator()
+        filename = f"shopping_list.{file_format}"
+        response = StreamingHttpResponse(
+            render(rows), content_type=content_type)
         response['Content-Disposition'] = (
             'attachment; filename={0}'.format(filename))
         return response
@@ -194,6 +332,7 @@ class UsersViewSet(UserViewSet):
     queryset = User.objects.all()
     lookup_field = 'username'
     pagination_class = SubscribtionPagintation
+    replica_reads = True
     filter_backends = (filters.OrderingFilter, filters.SearchFilter,)
     ordering = ['username']
     search_fields = ['username']
@@ -220,9 +359,18 @@ class UsersViewSet(UserViewSet):
     def subscriptions(self, request):
         """Ваши подписки."""
 
-        user_subscriptions = User.objects.filter(follow__user=request.user)
+        recipes_limit = get_recipes_limit(request)
+        user_subscriptions = User.objects.filter(
+            follow__user=request.user
+        ).annotate(
+            is_followed=Value(True, output_field=BooleanField()),
+        ).order_by('id')
 
         page = self.paginate_queryset(user_subscriptions)
+        previews = get_recipes_preview(
+            [author.id for author in page], recipes_limit)
+        for author in page:
+            author.recipes_preview = previews[author.id]
         serializer = SubscriptionsSerializer(
             page,
             context=self.get_serializer_context(),
@@ -273,3 +421,21 @@ def set_password(request):
     return Response(
         {'error': 'Введите верные данные!'},
         status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['get'])
+@permission_classes([IsAdmin])
+def token_cache_stats(request):
+    """Статистика кэша токенов."""
+
+    return Response(token_cache.stats())
+
+
+@api_view(['get'])
+@permission_classes([IsAdmin])
+def metrics_view(request):
+    """Гистограммы запросов API в формате Prometheus."""
+
+    return HttpResponse(
+        metrics.registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,25 @@
+"""
+ASGI config for foodgram project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
+"""
+
+import os
+
+from asgiref.sync import ThreadSensitiveContext
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+
+django_application = get_asgi_application()
+
+
+async def application(scope, receive, send):
+    # Django 3.2 выполняет синхронный код всех запросов (view списка
+    # рецептов, ORM) в одном общем потоке. Контекст на запрос дает
+    # каждому запросу свой поток, как в Django 4.
+    async with ThreadSensitiveContext():
+        await django_application(scope, receive, send)
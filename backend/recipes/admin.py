@@ -1,7 +1,7 @@
 from django.contrib.admin import ModelAdmin, register
 
-from .models import (Favorite, Ingredient, Product, Recipe, ShoppingCart,
-                     Subscribe, Tag)
+from .models import (Favorite, ImageJob, Ingredient, Product, Recipe,
+                     ShoppingCart, Subscribe, Tag)
 
 EMPTY = '-пусто-'
 
@@ -27,11 +27,12 @@ class ProductAdmin(ModelAdmin):
 class RecipeAdmin(ModelAdmin):
     list_display = ('name', 'author', 'added_in_favorites')
     list_filter = ('name', 'author', 'tags',)
-    readonly_fields = ('added_in_favorites',)
+    readonly_fields = ('favorites_count', 'in_carts_count')
     empty_value_display = EMPTY
 
     def added_in_favorites(self, obj):
-        return obj.favorite_recipe.count()
+        return obj.favorites_count
+    added_in_favorites.admin_order_field = 'favorites_count'
 
 
 @register(Ingredient)
@@ -63,3 +64,11 @@ class ShopCartAdmin(ModelAdmin):
     list_display = ('user', 'recipe',)
     list_filter = ('user', 'recipe',)
     empty_value_display = EMPTY
+
+
+@register(ImageJob)
+class ImageJobAdmin(ModelAdmin):
+    list_display = ('id', 'recipe', 'status', 'attempts', 'updated')
+    list_filter = ('status',)
+    readonly_fields = ('created', 'updated')
+    empty_value_display = EMPTY
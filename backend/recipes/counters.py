@@ -0,0 +1,102 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from users.models import User
+from .models import Favorite, Recipe, ShoppingCart, Subscribe
+
+""" Денормализованные счетчики рецептов и пользователей."""
+
+# (модель, поле счетчика, модель строк, FK строк на модель)
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Subscribe, 'author'),
+)
+
+
+def increment(model, pks, counter):
+    model.objects.filter(pk__in=pks).update(**{counter: F(counter) + 1})
+
+
+def decrement(model, pks, counter):
+    model.objects.filter(pk__in=pks, **{f'{counter}__gt': 0}).update(
+        **{counter: F(counter) - 1})
+
+
+def added(rows, targets):
+    """ Счетчики после массовой вставки строк rows, минуя сигналы.
+
+        targets - id объектов, на которые ссылаются новые строки,
+        по одному на строку.
+    """
+    for model, counter, row_model, field in COUNTERS:
+        if row_model is rows and targets:
+            increment(model, targets, counter)
+
+
+def removed(rows, targets):
+    """ Счетчики после массового удаления строк rows, минуя сигналы."""
+    for model, counter, row_model, field in COUNTERS:
+        if row_model is rows and targets:
+            decrement(model, targets, counter)
+
+
+def actual_count(rows, field):
+    """ Подзапрос с настоящим числом строк для OuterRef('pk')."""
+    return Coalesce(Subquery(
+        rows.objects.filter(**{field: OuterRef('pk')})
+        .order_by().values(field)
+        .annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def drifted(model, counter, rows, field):
+    """ Объекты, у которых сохраненный счетчик разошелся с данными."""
+    return model.objects.annotate(
+        actual=actual_count(rows, field)).exclude(**{counter: F('actual')})
+
+
+def reconcile(fix=True):
+    """ Пересчитывает счетчики и возвращает расхождения по каждому.
+
+        Пересчет идет одним UPDATE на счетчик и только по разошедшимся
+        строкам. Расхождения возможны после загрузки данных в обход
+        сигналов и при гонке счетчика с save() всего объекта.
+    """
+    report = {}
+    for model, counter, rows, field in COUNTERS:
+        stale = drifted(model, counter, rows, field)
+        report[f'{model.__name__}.{counter}'] = {
+            'rows': stale.count(),
+            'drift': sum(abs(stored - actual) for stored, actual in
+                         stale.values_list(counter, 'actual')),
+        }
+        if fix:
+            model.objects.filter(pk__in=stale.values('pk')).update(
+                **{counter: actual_count(rows, field)})
+    return report
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Subscribe)
+@receiver(post_save, sender=Recipe)
+def increment_counter(sender, instance, created, **kwargs):
+    if not created:
+        return
+    for model, counter, rows, field in COUNTERS:
+        if rows is sender:
+            increment(model, [getattr(instance, f'{field}_id')], counter)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Subscribe)
+@receiver(post_delete, sender=Recipe)
+def decrement_counter(sender, instance, **kwargs):
+    for model, counter, rows, field in COUNTERS:
+        if rows is sender:
+            decrement(model, [getattr(instance, f'{field}_id')], counter)
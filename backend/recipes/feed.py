@@ -0,0 +1,103 @@
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import FeedItem, Recipe, Subscribe
+
+""" Лента подписок: рецепты раскладываются по лентам при записи."""
+
+FEED_SIZE = getattr(settings, 'FEED_SIZE', 500)
+
+
+def insert_rows(select_sql, params):
+    """ INSERT ... SELECT в ленту, дубли пропускаются."""
+    table = FeedItem._meta.db_table
+    insert = connection.ops.insert_statement(ignore_conflicts=True)
+    suffix = connection.ops.ignore_conflicts_suffix_sql(
+        ignore_conflicts=True)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{insert} {table} (user_id, recipe_id, author_id) '
+            f'{select_sql} {suffix}', params)
+
+
+def trim(users):
+    """ Оставляет в лентах users не больше FEED_SIZE свежих рецептов.
+
+        users - список id или подзапрос, который их возвращает.
+        Нумеруются только переполненные ленты, поэтому в обычном
+        случае запрос сводится к подсчету строк по индексу.
+    """
+    overflow = FeedItem.objects.filter(user__in=users).values(
+        'user').annotate(total=Count('id')).filter(
+            total__gt=FEED_SIZE).values('user')
+    ranked = FeedItem.objects.filter(user__in=overflow).annotate(
+        position=Window(
+            expression=RowNumber(),
+            partition_by=[F('user')],
+            order_by=F('recipe').desc(),
+        )
+    ).values('id', 'position')
+    sql, params = ranked.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FeedItem._meta.db_table} WHERE id IN '
+            f'(SELECT id FROM ({sql}) ranked WHERE position > %s)',
+            (*params, FEED_SIZE))
+
+
+def fan_out(recipe):
+    """ Добавляет новый рецепт в ленты всех подписчиков автора."""
+    subscribe = Subscribe._meta.db_table
+    insert_rows(
+        f'SELECT user_id, %s, author_id FROM {subscribe} '
+        'WHERE author_id = %s',
+        (recipe.id, recipe.author_id))
+    trim(Subscribe.objects.filter(
+        author=recipe.author_id).values('user'))
+
+
+def backfill(user_id, author_ids):
+    """ После подписки добавляет в ленту последние рецепты авторов."""
+    recipes = Recipe.objects.filter(author__in=author_ids).order_by(
+        '-id').values('id', 'author_id')[:FEED_SIZE]
+    sql, params = recipes.query.sql_with_params()
+    insert_rows(
+        f'SELECT %s, id, author_id FROM ({sql}) recipes',
+        (user_id, *params))
+    trim([user_id])
+
+
+def prune(user_id, author_ids):
+    """ После отписки убирает рецепты авторов из ленты."""
+    FeedItem.objects.filter(user=user_id, author__in=author_ids).delete()
+
+
+def rebuild(user_id):
+    """ Собирает ленту пользователя заново из его подписок."""
+    FeedItem.objects.filter(user=user_id).delete()
+    insert_rows(
+        f'SELECT %s, r.id, r.author_id FROM {Recipe._meta.db_table} r '
+        f'JOIN {Subscribe._meta.db_table} s ON s.author_id = r.author_id '
+        'WHERE s.user_id = %s ORDER BY r.id DESC LIMIT %s',
+        (user_id, user_id, FEED_SIZE))
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(instance, created, **kwargs):
+    if created:
+        fan_out(instance)
+
+
+@receiver(post_save, sender=Subscribe)
+def backfill_feed(instance, created, **kwargs):
+    if created:
+        backfill(instance.user_id, [instance.author_id])
+
+
+@receiver(post_delete, sender=Subscribe)
+def prune_feed(instance, **kwargs):
+    prune(instance.user_id, [instance.author_id])
@@ -0,0 +1,114 @@
+import io
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .models import ImageJob, Recipe
+
+""" Фоновая сборка миниатюр изображений рецептов."""
+
+THUMBNAIL_SIZE = getattr(settings, 'RECIPE_THUMBNAIL_SIZE', (480, 480))
+JPEG_QUALITY = getattr(settings, 'RECIPE_THUMBNAIL_JPEG_QUALITY', 85)
+WEBP_QUALITY = getattr(settings, 'RECIPE_THUMBNAIL_WEBP_QUALITY', 80)
+
+
+def enqueue(recipe):
+    """ Ставит рецепт в очередь на сборку миниатюр."""
+    if recipe.image:
+        ImageJob.objects.create(recipe=recipe)
+
+
+def claim_jobs(limit, stale_after):
+    """ Забирает задачи в работу.
+
+        Задачи, зависшие в статусе processing дольше stale_after секунд
+        (например, после падения воркера), забираются повторно.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            ImageJob.objects
+            .select_for_update(skip_locked=True)
+            .filter(
+                Q(status=ImageJob.PENDING)
+                | Q(status=ImageJob.PROCESSING,
+                    updated__lt=now - timedelta(seconds=stale_after))
+            )
+            .order_by('id')
+            .values_list('id', flat=True)[:limit]
+        )
+        ImageJob.objects.filter(id__in=ids).update(
+            status=ImageJob.PROCESSING,
+            attempts=F('attempts') + 1,
+            updated=now,
+        )
+    return ImageJob.objects.filter(id__in=ids).select_related(
+        'recipe').order_by('id')
+
+
+def render(source, image_format, quality):
+    image = ImageOps.exif_transpose(Image.open(source))
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    image.thumbnail(THUMBNAIL_SIZE, Image.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def build_variants(recipe):
+    """ Собирает JPEG и WebP миниатюры из текущего image рецепта.
+
+        Рецепт обновляется, только если image не поменяли за время
+        сборки; иначе результат выбрасывается - новую картинку
+        обработает следующая задача из очереди.
+    """
+    source = recipe.image.name
+    if not source or recipe.image_variants_source == source:
+        return
+    with recipe.image.open('rb') as f:
+        data = f.read()
+    base = os.path.splitext(os.path.basename(source))[0]
+    old = (recipe.image_thumbnail, recipe.image_thumbnail_webp)
+    storage = recipe.image_thumbnail.storage
+    thumbnail = storage.save(
+        recipe.image_thumbnail.field.generate_filename(
+            recipe, f'{base}.jpg'),
+        ContentFile(render(io.BytesIO(data), 'JPEG', JPEG_QUALITY)))
+    webp = storage.save(
+        recipe.image_thumbnail_webp.field.generate_filename(
+            recipe, f'{base}.webp'),
+        ContentFile(render(io.BytesIO(data), 'WEBP', WEBP_QUALITY)))
+    updated = Recipe.objects.filter(pk=recipe.pk, image=source).update(
+        image_thumbnail=thumbnail,
+        image_thumbnail_webp=webp,
+        image_variants_source=source,
+        updated=timezone.now(),
+    )
+    if updated:
+        stale = [file.name for file in old if file]
+    else:
+        stale = [thumbnail, webp]
+    for name in stale:
+        storage.delete(name)
+
+
+def process_job(job, max_attempts):
+    try:
+        build_variants(job.recipe)
+    except Exception as error:
+        job.status = (
+            ImageJob.FAILED if job.attempts >= max_attempts
+            else ImageJob.PENDING)
+        job.error = repr(error)
+    else:
+        job.status = ImageJob.DONE
+        job.error = ''
+    job.save(update_fields=('status', 'error', 'updated'))
+    return job.status
@@ -0,0 +1,271 @@
+import io
+import itertools
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from PIL import Image
+
+from api import list_cache, product_index, tag_cache
+from recipes import search
+from recipes.models import (Favorite, Ingredient, Product, Recipe,
+                            ShoppingCart, Subscribe, Tag)
+from users.models import User
+
+""" Основная логика команды generate_dataset для синтетических данных"""
+
+PASSWORD = 'Dataset-pass-2022'
+PLACEHOLDERS = 16
+WORDS = (
+    'суп', 'салат', 'паста', 'пирог', 'рагу', 'каша', 'омлет', 'плов',
+    'запеканка', 'котлеты', 'блины', 'соус', 'торт', 'гратен', 'ризотто',
+    'курица', 'говядина', 'рыба', 'грибы', 'овощи', 'сыр', 'томаты',
+    'картофель', 'рис', 'тыква', 'шпинат', 'яблоки', 'шоколад', 'ягоды',
+)
+
+
+def power_law(size, exponent):
+    """ Накопленные веса закона Ципфа для random.choices: i-й по
+        популярности элемент выбирается в (i + 1) ** exponent раз
+        реже первого. """
+    return list(itertools.accumulate(
+        1 / (rank + 1) ** exponent for rank in range(size)))
+
+
+def batches(items, size):
+    iterator = iter(items)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def placeholder(color):
+    """ Однотонная PNG 8x8 на несколько десятков байт."""
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class Command(BaseCommand):
+    """ Заполняет БД синтетическими пользователями, рецептами,
+        ингредиентами, избранным, корзинами и подписками.
+
+        Популярность авторов, рецептов, тэгов и продуктов распределена
+        по степенному закону, случайность задается --seed. Строки
+        вставляются bulk_create пачками в обход сигналов, поэтому
+        после вставки счетчики, поисковый индекс и списки покупок
+        пересчитываются целиком, а общие кэши API сбрасываются.
+    """
+
+    help = 'Генерирует синтетический набор данных для нагрузочных тестов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--recipes', type=int, default=50000)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--tags', type=int, default=8)
+        parser.add_argument(
+            '--favorites', type=int, default=200000,
+            help='Всего записей избранного.')
+        parser.add_argument(
+            '--carts', type=int, default=50000,
+            help='Всего рецептов в корзинах.')
+        parser.add_argument(
+            '--subscriptions', type=int, default=100000,
+            help='Всего подписок.')
+        parser.add_argument(
+            '--exponent', type=float, default=1.1,
+            help='Показатель степенного закона популярности.')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--prefix', default='user',
+            help='Префикс имен и почт пользователей.')
+        parser.add_argument(
+            '--images', action='store_true',
+            help='Записать заглушки изображений в MEDIA_ROOT.')
+        parser.add_argument(
+            '--feeds', action='store_true',
+            help='Собрать ленты подписок (до FEED_SIZE строк на читателя).')
+
+    def handle(self, *args, **options):
+        if User.objects.filter(
+                username__startswith=options['prefix']).exists():
+            raise CommandError(
+                f'Пользователи с префиксом {options["prefix"]} уже есть, '
+                'укажите другой --prefix')
+        self.rnd = random.Random(options['seed'])
+        self.exponent = options['exponent']
+        self.batch_size = options['batch_size']
+        self.started = time.perf_counter()
+        self.total = 0
+
+        if not Product.objects.exists():
+            call_command('load_data', stdout=io.StringIO())
+        product_ids = list(Product.objects.values_list('id', flat=True))
+        self.rnd.shuffle(product_ids)
+        tag_ids = self.create_tags(options['tags'])
+        user_ids = self.create_users(options['users'], options['prefix'])
+        recipe_ids = self.create_recipes(
+            options['recipes'], user_ids, tag_ids, options['images'])
+        self.create_ingredients(
+            recipe_ids, product_ids, options['ingredients_per_recipe'])
+        self.create_pairs(
+            Favorite, 'recipe', options['favorites'], user_ids, recipe_ids)
+        self.create_pairs(
+            ShoppingCart, 'recipe', options['carts'], user_ids, recipe_ids)
+        self.create_pairs(
+            Subscribe, 'author', options['subscriptions'],
+            user_ids, user_ids, exclude_self=True)
+        self.rebuild_derived(options['feeds'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано {self.total} строк за {self.elapsed():.1f} с'))
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def insert(self, model, objects):
+        """ bulk_create пачками; возвращает id новых строк по порядку.
+
+            id берутся запросом: SQLite в Django 3.2 не возвращает
+            их из bulk_create.
+        """
+        last_id = model.objects.order_by('-id').values_list(
+            'id', flat=True).first() or 0
+        count = 0
+        for batch in batches(objects, self.batch_size):
+            model.objects.bulk_create(batch, batch_size=self.batch_size)
+            count += len(batch)
+        self.total += count
+        self.stdout.write(
+            f'{model._meta.db_table}: {count} '
+            f'({self.elapsed():.1f} с)')
+        return list(model.objects.filter(id__gt=last_id).order_by(
+            'id').values_list('id', flat=True))
+
+    def create_tags(self, count):
+        tag_ids = list(Tag.objects.order_by('id').values_list('id', flat=True))
+        existing = set(Tag.objects.values_list('slug', flat=True))
+        missing = (
+            Tag(name=f'Тэг {number}', slug=f'tag-{number}',
+                color='#{:06X}'.format(self.rnd.randrange(0x1000000)))
+            for number in itertools.count(1)
+            if f'tag-{number}' not in existing
+        )
+        return tag_ids + self.insert(
+            Tag, itertools.islice(missing, max(count - len(tag_ids), 0)))
+
+    def create_users(self, count, prefix):
+        password = make_password(PASSWORD)
+        user_ids = self.insert(User, (
+            User(username=f'{prefix}{number}',
+                 email=f'{prefix}{number}@foodgram.ru',
+                 first_name='Имя', last_name='Фамилия', password=password)
+            for number in range(count)
+        ))
+        # Ранг популярности не должен совпадать с порядком id.
+        self.rnd.shuffle(user_ids)
+        return user_ids
+
+    def create_recipes(self, count, user_ids, tag_ids, images):
+        rnd = self.rnd
+        authors = power_law(len(user_ids), self.exponent)
+        files = self.write_placeholders() if images else [None]
+        recipe_ids = self.insert(Recipe, (
+            Recipe(author_id=author_id,
+                   name=' '.join(rnd.sample(WORDS, 3)).capitalize(),
+                   text=' '.join(rnd.choices(WORDS, k=40)),
+                   cooking_time=rnd.randint(1, 180),
+                   image=files[number % len(files)])
+            for number, author_id in enumerate(rnd.choices(
+                user_ids, cum_weights=authors, k=count))
+        ))
+        # Популярность рецептов тоже не зависит от порядка создания.
+        ranked = recipe_ids[:]
+        rnd.shuffle(ranked)
+        tags = power_law(len(tag_ids), self.exponent)
+        recipe_tag = Recipe.tags.through
+        self.insert(recipe_tag, (
+            recipe_tag(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in set(rnd.choices(
+                tag_ids, cum_weights=tags, k=rnd.randint(1, 3)))
+        ))
+        return ranked
+
+    def write_placeholders(self):
+        return [
+            default_storage.save(
+                f'placeholders/{number}.png',
+                ContentFile(placeholder(
+                    tuple(self.rnd.randrange(256) for _ in range(3)))))
+            for number in range(PLACEHOLDERS)
+        ]
+
+    def create_ingredients(self, recipe_ids, product_ids, per_recipe):
+        rnd = self.rnd
+        products = power_law(len(product_ids), self.exponent)
+        per_recipe = min(per_recipe, len(product_ids))
+
+        def pick():
+            chosen = set()
+            while len(chosen) < per_recipe:
+                chosen.update(rnd.choices(
+                    product_ids, cum_weights=products,
+                    k=per_recipe - len(chosen)))
+            return chosen
+
+        self.insert(Ingredient, (
+            Ingredient(recipe_id=recipe_id, product_id_id=product_id,
+                       amount=rnd.randint(1, 500))
+            for recipe_id in sorted(recipe_ids)
+            for product_id in pick()
+        ))
+
+    def create_pairs(self, model, field, count, user_ids, target_ids,
+                     exclude_self=False):
+        """ count уникальных пар (пользователь, цель); с exclude_self
+            без пар пользователя с самим собой.
+
+            Активность пользователей и популярность целей - по
+            степенному закону; при насыщении пар может выйти меньше.
+        """
+        rnd = self.rnd
+        users = power_law(len(user_ids), self.exponent)
+        targets = power_law(len(target_ids), self.exponent)
+        pairs = set()
+        for _ in range(10):
+            missing = count - len(pairs)
+            if missing <= 0:
+                break
+            pairs.update(
+                pair for pair in zip(
+                    rnd.choices(user_ids, cum_weights=users, k=missing),
+                    rnd.choices(target_ids, cum_weights=targets, k=missing))
+                if not (exclude_self and pair[0] == pair[1])
+            )
+        self.insert(model, (
+            model(user_id=user_id, **{f'{field}_id': target_id})
+            for user_id, target_id in sorted(pairs)[:count]
+        ))
+
+    def rebuild_derived(self, feeds):
+        call_command('reconcile_counters', stdout=io.StringIO())
+        with transaction.atomic():
+            search.index()
+        call_command('rebuild_shopping_lists', stdout=io.StringIO())
+        if feeds:
+            call_command('rebuild_feeds', stdout=io.StringIO())
+        # bulk_create не шлет сигналов, поэтому кэши тэгов, продуктов
+        # и страниц рецептов в запущенных процессах сбрасываются явно.
+        tag_cache.bump_version()
+        product_index.bump_version()
+        list_cache.bump_recipes()
+        self.stdout.write(f'Производные данные ({self.elapsed():.1f} с)')
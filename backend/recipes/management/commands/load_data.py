@@ -1,27 +1,111 @@
 import csv
+import io
+import json
 import os
+import time
 
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api import product_index
 from recipes.models import Product
 
-""" Основная логика команды load_data для импорта csv данных в БД"""
+""" Основная логика команды load_data для импорта csv/json данных в БД"""
+
+DEFAULT_FILE = os.path.join(settings.BASE_DIR, 'static/data/ingredients.csv')
+HEADER = ('name', 'measurement_unit')
+
+
+def read_csv(file_path):
+    with open(file_path, encoding='utf-8') as f:
+        for row in csv.reader(f):
+            if len(row) < 2 or tuple(row[:2]) == HEADER:
+                continue
+            yield row[0].strip(), row[1].strip()
+
+
+def read_json(file_path):
+    with open(file_path, encoding='utf-8') as f:
+        for item in json.load(f):
+            yield item['name'].strip(), item['measurement_unit'].strip()
+
+
+READERS = {'.csv': read_csv, '.json': read_json}
 
 
 class Command(BaseCommand):
-    """ Команда предназначена для импорта csv данных в БД"""
+    """ Команда предназначена для импорта продуктов в БД.
+
+        Повторный запуск пропускает уже загруженные пары
+        (name, measurement_unit), поэтому прерванный импорт
+        можно просто запустить еще раз.
+    """
+
+    help = 'Загружает продукты из csv или json файла.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', default=DEFAULT_FILE)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--no-copy', action='store_true',
+            help='Не использовать COPY даже на PostgreSQL.')
+
     def handle(self, *args, **options):
-        file_path = os.path.join(
-            settings.BASE_DIR, 'static/data/ingredients.csv')
-        with open(file_path, encoding='utf-8') as f:
-            reader = csv.reader(f)
-            first_line = 1
-            for row in reader:
-                if first_line:
-                    first_line = 0
-                    continue
-                Product.objects.create(
-                    name=row[0],
-                    measurement_unit=row[1]
-                )
-            f.close()
+        file_path = options['file']
+        reader = READERS.get(os.path.splitext(file_path)[1].lower())
+        if reader is None:
+            raise CommandError('Поддерживаются только .csv и .json файлы')
+        if not os.path.exists(file_path):
+            raise CommandError(f'Файл {file_path} не найден')
+        started = time.perf_counter()
+        rows = list(dict.fromkeys(reader(file_path)))
+        with transaction.atomic():
+            if connection.vendor == 'postgresql' and not options['no_copy']:
+                created = self.copy_rows(rows)
+            else:
+                created = self.bulk_create_rows(rows, options['batch_size'])
+            # Импорт идет в обход сигналов Product, поэтому индекс
+            # автодополнения в запущенных процессах сбрасывается явно.
+            transaction.on_commit(product_index.bump_version)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено {created}, пропущено {len(rows) - created} '
+            f'из {len(rows)} за {elapsed:.2f} с '
+            f'({len(rows) / max(elapsed, 1e-6):.0f} строк/с)'
+        ))
+
+    def bulk_create_rows(self, rows, batch_size):
+        existing = set(
+            Product.objects.values_list('name', 'measurement_unit'))
+        products = [
+            Product(name=name, measurement_unit=unit)
+            for name, unit in rows if (name, unit) not in existing
+        ]
+        batch_size = min(batch_size, connection.ops.bulk_batch_size(
+            HEADER, products) or batch_size)
+        for start in range(0, len(products), batch_size):
+            batch = products[start:start + batch_size]
+            Product.objects.bulk_create(batch, batch_size=batch_size)
+            self.stdout.write(f'{start + len(batch)}/{len(products)}')
+        return len(products)
+
+    def copy_rows(self, rows):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        table = Product._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMP TABLE product_import '
+                '(name varchar(200), measurement_unit varchar(200)) '
+                'ON COMMIT DROP')
+            cursor.copy_expert(
+                'COPY product_import FROM STDIN WITH (FORMAT csv)', buffer)
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT i.name, i.measurement_unit FROM product_import i '
+                f'WHERE NOT EXISTS (SELECT 1 FROM {table} p '
+                'WHERE p.name = i.name '
+                'AND p.measurement_unit = i.measurement_unit)')
+            return cursor.rowcount
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.images import claim_jobs, process_job
+
+""" Основная логика команды process_images - воркера очереди миниатюр"""
+
+
+class Command(BaseCommand):
+    """ Воркер очереди ImageJob.
+
+        Забирает задачи пачками и собирает миниатюры рецептов.
+        Неудачные задачи возвращаются в очередь, пока не исчерпан
+        лимит попыток. Можно запускать несколько воркеров: на
+        PostgreSQL задачи разбираются через SKIP LOCKED.
+    """
+
+    help = 'Собирает миниатюры изображений рецептов из очереди.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Разобрать очередь и выйти.')
+        parser.add_argument('--batch-size', type=int, default=20)
+        parser.add_argument(
+            '--sleep', type=float, default=2,
+            help='Пауза между опросами пустой очереди, с.')
+        parser.add_argument('--max-attempts', type=int, default=3)
+        parser.add_argument(
+            '--stale-after', type=int, default=600,
+            help='Через сколько секунд зависшая задача берется заново.')
+
+    def handle(self, *args, **options):
+        while True:
+            jobs = claim_jobs(options['batch_size'], options['stale_after'])
+            for job in jobs:
+                status = process_job(job, options['max_attempts'])
+                self.stdout.write(f'Рецепт {job.recipe_id}: {status}')
+            if not jobs:
+                if options['once']:
+                    return
+                time.sleep(options['sleep'])
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.feed import rebuild
+from recipes.models import FeedItem, Subscribe
+
+""" Основная логика команды rebuild_feeds для пересборки лент подписок"""
+
+
+class Command(BaseCommand):
+    """ Пересобирает ленты подписок из таблицы Subscribe.
+
+        Нужна после массовой загрузки данных в обход сигналов
+        и для восстановления лент, урезанных отписками.
+    """
+
+    help = 'Пересобирает ленты подписок пользователей.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, nargs='*', dest='users',
+            help='id пользователей; по умолчанию - все.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        user_ids = options['users']
+        with transaction.atomic():
+            if user_ids is None:
+                FeedItem.objects.all().delete()
+                user_ids = list(
+                    Subscribe.objects.order_by('user').values_list(
+                        'user', flat=True).distinct())
+            for position, user_id in enumerate(user_ids, 1):
+                rebuild(user_id)
+                if position % 1000 == 0:
+                    self.stdout.write(f'{position} лент')
+        self.stdout.write(self.style.SUCCESS(
+            f'Ленты пересобраны за {time.perf_counter() - started:.2f} с'))
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.shopping_list import rebuild
+
+""" Основная логика команды rebuild_shopping_lists"""
+
+
+class Command(BaseCommand):
+    """ Пересчитывает материализованные списки покупок из корзин.
+
+        Нужна после загрузки данных в обход API и правки ингредиентов
+        через админку.
+    """
+
+    help = 'Пересчитывает списки покупок пользователей.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, nargs='+', dest='users',
+            help='id пользователей; по умолчанию - все.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        with transaction.atomic():
+            rebuild(options['users'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Списки покупок пересчитаны за '
+            f'{time.perf_counter() - started:.2f} с'))
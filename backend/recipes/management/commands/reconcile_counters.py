@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.counters import reconcile
+
+""" Основная логика команды reconcile_counters для сверки счетчиков"""
+
+
+class Command(BaseCommand):
+    """ Сверяет денормализованные счетчики с данными и исправляет их."""
+
+    help = 'Пересчитывает счетчики избранного, корзин, рецептов и подписок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать расхождения.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            report = reconcile(fix=not options['dry_run'])
+        for counter, drift in report.items():
+            style = self.style.WARNING if drift['rows'] else str
+            self.stdout.write(style(
+                f'{counter}: строк {drift["rows"]}, '
+                f'расхождение {drift["drift"]}'))
+        if options['dry_run']:
+            return
+        self.stdout.write(self.style.SUCCESS('Счетчики пересчитаны'))
@@ -0,0 +1,48 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:16
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_feeds(apps, schema_editor):
+    """ Ленты из существующих подписок: до FEED_SIZE свежих рецептов
+        на читателя, как у recipes.feed.rebuild. """
+    schema_editor.execute(
+        'INSERT INTO recipes_feeditem (user_id, recipe_id, author_id) '
+        'SELECT user_id, recipe_id, author_id FROM ('
+        'SELECT s.user_id, r.id AS recipe_id, r.author_id, ROW_NUMBER() '
+        'OVER (PARTITION BY s.user_id ORDER BY r.id DESC) AS feed_position '
+        'FROM recipes_subscribe s '
+        'JOIN recipes_recipe r ON r.author_id = s.author_id) ranked '
+        'WHERE feed_position <= %s',
+        (getattr(settings, 'FEED_SIZE', 500),))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0005_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedItem',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_items', to='recipes.Recipe', verbose_name='Рецепт')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_items', to=settings.AUTH_USER_MODEL, verbose_name='Подписчик')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='feeditem',
+            index=models.Index(fields=['user', 'author'], name='feed_item_user_author_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='feeditem',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_feed_item'),
+        ),
+        migrations.RunPython(fill_feeds, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,12 @@
 from colorfield.fields import ColorField
 
+from django.contrib.postgres.search import SearchVectorField
 from django.core import validators
 from django.db import models
-from django.db.models import UniqueConstraint
+from django.db.models import (BooleanField, Exists, OuterRef, Prefetch,
+                              UniqueConstraint, Value)
 
-from users.models import User
+from users.models import CounterFieldsMixin, User
 
 
 class Product(models.Model):
@@ -17,6 +19,15 @@ class Product(models.Model):
         verbose_name='единица измерения',
     )
 
+    class Meta:
+        # varchar_pattern_ops нужен PostgreSQL для LIKE 'префикс%'
+        # при любой локали; остальные БД строят обычный индекс.
+        indexes = [models.Index(
+            fields=['name'],
+            name='product_name_prefix_idx',
+            opclasses=['varchar_pattern_ops'],
+        )]
+
     def __str__(self):
         return str(self.name)
 
@@ -40,6 +51,11 @@ class Subscribe(models.Model):
             fields=['user', 'author'],
             name='unique_subscribe',
         )]
+        # Подписчики автора (лента, счетчики) читаются только из индекса.
+        indexes = [models.Index(
+            fields=['author', 'user'],
+            name='subscribe_author_user_idx',
+        )]
 
     def __str__(self):
         return f'{self.author} {self.user}'
@@ -60,7 +76,40 @@ class Tag(models.Model):
         return self.name
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+
+    def with_related(self):
+        """ Подтягивает автора, тэги и ингредиенты фиксированным
+            числом запросов, независимо от размера страницы. """
+        return self.select_related('author').prefetch_related(
+            'tags',
+            Prefetch(
+                'recipe_ingredient',
+                queryset=Ingredient.objects.select_related('product_id')
+            ),
+        )
+
+    def with_user_flags(self, user):
+        """ Добавляет is_favorited, is_in_shopping_cart
+            и is_author_subscribed для пользователя запроса. """
+        if user.is_anonymous:
+            false = Value(False, output_field=BooleanField())
+            return self.annotate(
+                is_favorited=false,
+                is_in_shopping_cart=false,
+                is_author_subscribed=false,
+            )
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_author_subscribed=Exists(Subscribe.objects.filter(
+                user=user, author=OuterRef('author'))),
+        )
+
+
+class Recipe(CounterFieldsMixin, models.Model):
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -91,10 +140,104 @@ class Recipe(models.Model):
         verbose_name='Время приготовления в мин.',
         validators=[validators.MinValueValidator(
             1, message='Время приготовления должно быть больше 1 мин.'), ])
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата создания',
+    )
+    updated = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения',
+    )
+
+    image_thumbnail = models.ImageField(
+        upload_to='variants/',
+        blank=True,
+        null=True,
+        verbose_name='Миниатюра',
+    )
+    image_thumbnail_webp = models.ImageField(
+        upload_to='variants/',
+        blank=True,
+        null=True,
+        verbose_name='Миниатюра WebP',
+    )
+    image_variants_source = models.CharField(
+        max_length=100,
+        blank=True,
+        verbose_name='Исходник миниатюр',
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='В избранном',
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='В корзинах',
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+    )
+
+    objects = RecipeQuerySet.as_manager()
+    counter_fields = ('favorites_count', 'in_carts_count')
+
+    class Meta:
+        # Рецепты автора в порядке -id: фильтр author, превью подписок,
+        # догрузка ленты после подписки.
+        indexes = [models.Index(
+            fields=['author', '-id'],
+            name='recipe_author_id_idx',
+        )]
 
     def __str__(self):
         return str(self.name)
 
+    def get_image_variant(self, variant):
+        """ Вариант изображения, если он собран из текущего image,
+            иначе оригинал. """
+        file = getattr(self, variant)
+        if file and self.image and (
+                self.image_variants_source == self.image.name):
+            return file
+        return self.image
+
+
+class FullTextField(models.TextField):
+    """ Скрытая колонка FTS5 с именем таблицы: MATCH по ней ищет
+        во всех колонках. """
+
+
+@FullTextField.register_lookup
+class Match(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+class RecipeSearchIndex(models.Model):
+    """ Таблица FTS5 поиска рецептов на SQLite.
+
+        Создается миграцией 0008 и заполняется recipes.search; модель
+        нужна только для JOIN с рецептами в запросе поиска.
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column='rowid',
+        related_name='search_index',
+    )
+    document = FullTextField(db_column='recipes_recipe_fts')
+
+    class Meta:
+        managed = False
+        db_table = 'recipes_recipe_fts'
+
 
 class Ingredient(models.Model):
     recipe = models.ForeignKey(
@@ -167,3 +310,128 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return self.recipe
+
+
+class ImageJob(models.Model):
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (PROCESSING, 'В работе'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='image_jobs',
+        verbose_name='Рецепт'
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUSES,
+        default=PENDING,
+        verbose_name='Статус',
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Попытки',
+    )
+    error = models.TextField(
+        blank=True,
+        verbose_name='Ошибка',
+    )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата создания',
+    )
+    updated = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения',
+    )
+
+    class Meta:
+        indexes = [models.Index(
+            fields=['status', 'id'],
+            name='image_job_status_idx',
+        )]
+
+    def __str__(self):
+        return f'{self.recipe_id} {self.status}'
+
+
+class FeedItem(models.Model):
+    """ Рецепт в ленте подписок пользователя.
+
+        Заполняется при создании рецепта (fan-out on write), автор
+        продублирован, чтобы отписка удаляла записи без JOIN.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Подписчик'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Рецепт'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+
+    class Meta:
+        constraints = [UniqueConstraint(
+            fields=['user', 'recipe'],
+            name='unique_feed_item',
+        )]
+        indexes = [models.Index(
+            fields=['user', 'author'],
+            name='feed_item_user_author_idx',
+        )]
+
+    def __str__(self):
+        return f'{self.user_id} {self.recipe_id}'
+
+
+class ShoppingListItem(models.Model):
+    """ Итог по продукту в списке покупок пользователя.
+
+        Поддерживается инкрементально при изменении корзины
+        и ингредиентов рецептов из корзины.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь'
+    )
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Продукт'
+    )
+    total = models.IntegerField(
+        default=0,
+        verbose_name='Количество',
+    )
+
+    class Meta:
+        constraints = [UniqueConstraint(
+            fields=['user', 'product'],
+            name='unique_shopping_list_item',
+        )]
+
+    def __str__(self):
+        return f'{self.product_id} {self.total}'
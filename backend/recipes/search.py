@@ -0,0 +1,90 @@
+import re
+
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connection
+from django.db.models import F
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Recipe, RecipeSearchIndex
+
+""" Полнотекстовый поиск рецептов: tsvector на PostgreSQL, FTS5 на SQLite."""
+
+CONFIG = 'russian'
+FTS_TABLE = RecipeSearchIndex._meta.db_table
+# Веса bm25 для колонок FTS5: название важнее описания.
+NAME_WEIGHT = 10.0
+TEXT_WEIGHT = 1.0
+
+
+def use_tsvector():
+    return connection.vendor == 'postgresql'
+
+
+def search_vector():
+    return (SearchVector('name', weight='A', config=CONFIG)
+            + SearchVector('text', weight='B', config=CONFIG))
+
+
+def fts_query(query):
+    """ Слова запроса как префиксы FTS5; синтаксис MATCH из запроса
+        пользователя не пропускается. """
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', query))
+
+
+def index(recipe_ids=None):
+    """ Обновляет поисковый индекс рецептов recipe_ids, по умолчанию всех."""
+    rows = Recipe.objects.order_by()
+    if recipe_ids is not None:
+        rows = rows.filter(pk__in=recipe_ids)
+    if use_tsvector():
+        rows.update(search_vector=search_vector())
+        return
+    sql, params = rows.values_list(
+        'id', 'name', 'text').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid IN '
+            f'(SELECT id FROM ({sql}) recipes)', params)
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, text) {sql}', params)
+
+
+def search(queryset, query):
+    """ Фильтрует queryset по запросу и сортирует по релевантности.
+
+        Поиск остается частью того же SQL-запроса, поэтому сочетается
+        с любыми другими фильтрами.
+    """
+    if use_tsvector():
+        search_query = SearchQuery(query, config=CONFIG)
+        return queryset.filter(search_vector=search_query).annotate(
+            rank=SearchRank(F('search_vector'), search_query)
+        ).order_by('-rank', '-id')
+    terms = fts_query(query)
+    if not terms:
+        return queryset.none()
+    # FTS5 присоединяется к запросу один раз: ранг из коррелированного
+    # подзапроса пересчитывал бы MATCH для каждой строки. bm25 стоит
+    # только в ORDER BY - в подзапросах агрегатов SQLite его не считает.
+    return queryset.filter(search_index__document__match=terms).order_by(
+        RawSQL(f'bm25({FTS_TABLE}, %s, %s)',
+               (NAME_WEIGHT, TEXT_WEIGHT)).asc(),
+        '-id',
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def index_recipe(instance, **kwargs):
+    index([instance.pk])
+
+
+@receiver(post_delete, sender=Recipe)
+def unindex_recipe(instance, **kwargs):
+    if use_tsvector():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', (instance.pk,))
@@ -0,0 +1,90 @@
+from django.db import connection
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import Ingredient, ShoppingCart, ShoppingListItem
+
+""" Материализованный список покупок: итоги по продуктам для каждого
+    пользователя меняются на разницу, а не пересчитываются заново."""
+
+TABLE = ShoppingListItem._meta.db_table
+INGREDIENTS = Ingredient._meta.db_table
+CARTS = ShoppingCart._meta.db_table
+
+
+def upsert(select_sql, params):
+    """ Прибавляет к итогам строки (user_id, product_id, delta)."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {TABLE} (user_id, product_id, total) {select_sql} '
+            'ON CONFLICT (user_id, product_id) '
+            f'DO UPDATE SET total = {TABLE}.total + excluded.total',
+            params)
+
+
+def drop_empty(users):
+    ShoppingListItem.objects.filter(user__in=users, total__lte=0).delete()
+
+
+def change_for_user(user_id, recipe_ids, sign):
+    """ Добавляет (sign=1) или вычитает (sign=-1) ингредиенты рецептов
+        recipe_ids в списке покупок пользователя. """
+    if not recipe_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    upsert(
+        f'SELECT %s, product_id_id, %s * SUM(amount) FROM {INGREDIENTS} '
+        f'WHERE recipe_id IN ({placeholders}) GROUP BY product_id_id',
+        (user_id, sign, *recipe_ids))
+    if sign < 0:
+        drop_empty([user_id])
+
+
+def change_for_recipe(recipe_id, sign):
+    """ То же для всех пользователей, у которых рецепт в корзине.
+
+        Вызывается до (sign=-1) и после (sign=1) замены ингредиентов.
+    """
+    upsert(
+        f'SELECT c.user_id, i.product_id_id, %s * SUM(i.amount) '
+        f'FROM {INGREDIENTS} i JOIN {CARTS} c ON c.recipe_id = i.recipe_id '
+        'WHERE c.recipe_id = %s GROUP BY c.user_id, i.product_id_id',
+        (sign, recipe_id))
+    if sign < 0:
+        drop_empty(ShoppingCart.objects.filter(
+            recipe=recipe_id).values('user'))
+
+
+def rebuild(user_ids=None):
+    """ Пересчитывает списки покупок пользователей user_ids с нуля;
+        None - у всех, пустой список - ни у кого. """
+    if user_ids is not None and not user_ids:
+        return
+    items = ShoppingListItem.objects.all()
+    # WHERE нужен всегда: без него SQLite путает ON CONFLICT с ON JOIN.
+    carts = 'WHERE 1 = 1'
+    params = ()
+    if user_ids is not None:
+        items = items.filter(user__in=user_ids)
+        carts += ' AND c.user_id IN ({})'.format(
+            ', '.join(['%s'] * len(user_ids)))
+        params = tuple(user_ids)
+    items.delete()
+    upsert(
+        f'SELECT c.user_id, i.product_id_id, SUM(i.amount) '
+        f'FROM {INGREDIENTS} i JOIN {CARTS} c ON c.recipe_id = i.recipe_id '
+        f'{carts} GROUP BY c.user_id, i.product_id_id',
+        params)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_list(instance, created, **kwargs):
+    if created:
+        change_for_user(instance.user_id, [instance.recipe_id], 1)
+
+
+# pre_delete: при каскадном удалении рецепта его ингредиенты
+# удаляются раньше, чем отправляется post_delete для корзины.
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_from_shopping_list(instance, **kwargs):
+    change_for_user(instance.user_id, [instance.recipe_id], -1)
@@ -0,0 +1,83 @@
+import pytest
+from django.core.cache import cache
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import Product, Recipe, Tag
+from users.models import User
+
+PASSWORD = 'Test-pass-2022'
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+def make_user(username):
+    return User.objects.create_user(
+        username=username, email=f'{username}@foodgram.ru',
+        password=PASSWORD)
+
+
+def client_for(user):
+    client = APIClient()
+    token, _ = Token.objects.get_or_create(user=user)
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
+
+
+@pytest.fixture
+def user(db):
+    return make_user('user')
+
+
+@pytest.fixture
+def author(db):
+    return make_user('author')
+
+
+@pytest.fixture
+def user_client(user):
+    return client_for(user)
+
+
+@pytest.fixture
+def author_client(author):
+    return client_for(author)
+
+
+@pytest.fixture
+def tag(db):
+    return Tag.objects.create(
+        name='Завтрак', color='#E26C2D', slug='breakfast')
+
+
+@pytest.fixture
+def products(db):
+    return [
+        Product.objects.create(name='Мука', measurement_unit='г'),
+        Product.objects.create(name='Молоко', measurement_unit='мл'),
+        Product.objects.create(name='Яйца', measurement_unit='шт'),
+    ]
+
+
+@pytest.fixture
+def make_recipe(author, tag):
+    def make(ingredients, name='Блины', author=author):
+        """ Рецепт через модели; ingredients - пары (продукт, количество)."""
+        recipe = Recipe.objects.create(
+            author=author, name=name, text='Описание', cooking_time=10)
+        recipe.tags.set([tag])
+        for product, amount in ingredients:
+            recipe.recipe_ingredient.create(product_id=product, amount=amount)
+        return recipe
+    return make
+
+
+@pytest.fixture
+def recipe(make_recipe, products):
+    return make_recipe([(products[0], 200), (products[1], 300)])
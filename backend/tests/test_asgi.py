@@ -0,0 +1,57 @@
+import pytest
+from asgiref.sync import async_to_sync
+from rest_framework.authtoken.models import Token
+
+from foodgram.asgi import application
+from recipes.models import Favorite, ShoppingCart
+
+
+def asgi_request(path, token, method='GET'):
+    """ Запрос через ASGI-приложение; возвращает (статус, тело)."""
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': method, 'scheme': 'http', 'path': path, 'root_path': '',
+        'query_string': b'', 'server': ('testserver', 80),
+        'client': ('127.0.0.1', 12345),
+        'headers': [(b'host', b'testserver'),
+                    (b'authorization', f'Token {token}'.encode())],
+    }
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    async_to_sync(application)(scope, receive, send)
+    status = messages[0]['status']
+    body = b''.join(message.get('body', b'') for message in messages[1:])
+    return status, body.decode()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_download_shopping_cart_under_asgi(user, recipe):
+    ShoppingCart.objects.create(user=user, recipe=recipe)
+    token = Token.objects.create(user=user).key
+
+    status, body = asgi_request('/api/recipes/download_shopping_cart/', token)
+
+    assert status == 200
+    assert body.splitlines() == [
+        'Ингредиенты: ', 'Молоко - 300 мл. ', 'Мука - 200 г. ']
+
+
+@pytest.mark.django_db(transaction=True)
+def test_favorite_toggle_under_asgi(user, recipe):
+    token = Token.objects.create(user=user).key
+    path = f'/api/recipes/{recipe.id}/favorite/'
+
+    status, body = asgi_request(path, token, method='POST')
+    assert status == 200
+    assert f'"id":{recipe.id}' in body
+    assert Favorite.objects.filter(user=user, recipe=recipe).exists()
+
+    status, _ = asgi_request(path, token, method='DELETE')
+    assert status == 204
+    assert not Favorite.objects.filter(user=user).exists()
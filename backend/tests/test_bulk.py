@@ -0,0 +1,66 @@
+from recipes.models import ShoppingCart, ShoppingListItem
+
+FAVORITE = '/api/recipes/favorite/bulk/'
+CART = '/api/recipes/shopping_cart/bulk/'
+SUBSCRIBE = '/api/users/subscribe/bulk/'
+
+
+def statuses(response, key):
+    return {item['id']: item['status'] for item in response.data[key]}
+
+
+def totals(user):
+    return dict(ShoppingListItem.objects.filter(user=user).values_list(
+        'product__name', 'total'))
+
+
+def test_bulk_favorite_statuses_and_counters(user_client, recipe):
+    response = user_client.post(
+        FAVORITE, {'add': [recipe.id, 999], 'remove': [998]}, format='json')
+
+    assert response.status_code == 200
+    assert statuses(response, 'add') == {
+        recipe.id: 'created', 999: 'not_found'}
+    assert statuses(response, 'remove') == {998: 'not_found'}
+    recipe.refresh_from_db()
+    assert recipe.favorites_count == 1
+
+    repeated = user_client.post(
+        FAVORITE, {'add': [recipe.id]}, format='json')
+    assert statuses(repeated, 'add') == {recipe.id: 'exists'}
+    recipe.refresh_from_db()
+    assert recipe.favorites_count == 1
+
+    removed = user_client.post(
+        FAVORITE, {'remove': [recipe.id]}, format='json')
+    assert statuses(removed, 'remove') == {recipe.id: 'deleted'}
+    recipe.refresh_from_db()
+    assert recipe.favorites_count == 0
+
+
+def test_bulk_cart_updates_shopping_list(
+        user, user_client, make_recipe, products, recipe):
+    other = make_recipe([(products[0], 50), (products[2], 2)], name='Омлет')
+
+    user_client.post(CART, {'add': [recipe.id, other.id]}, format='json')
+
+    assert totals(user) == {'Мука': 250, 'Молоко': 300, 'Яйца': 2}
+    recipe.refresh_from_db()
+    assert recipe.in_carts_count == 1
+
+    user_client.post(CART, {'add': [recipe.id]}, format='json')
+    assert totals(user)['Мука'] == 250
+
+    user_client.post(CART, {'remove': [recipe.id]}, format='json')
+    assert totals(user) == {'Мука': 50, 'Яйца': 2}
+    assert not ShoppingCart.objects.filter(user=user, recipe=recipe).exists()
+
+
+def test_bulk_subscribe_forbids_self(user, user_client, author):
+    response = user_client.post(
+        SUBSCRIBE, {'add': [user.id, author.id]}, format='json')
+
+    assert statuses(response, 'add') == {
+        user.id: 'forbidden', author.id: 'created'}
+    author.refresh_from_db()
+    assert author.followers_count == 1
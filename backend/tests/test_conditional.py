@@ -0,0 +1,79 @@
+from django.utils.http import http_date
+
+from recipes.models import Favorite, Recipe
+
+LIST = '/api/recipes/'
+# С фильтром пользователя список не кэшируется и идет через агрегат.
+UNCACHED = '/api/recipes/?is_in_shopping_cart=false'
+FUTURE = http_date(4102444800)
+
+
+def detail(recipe):
+    return f'/api/recipes/{recipe.id}/'
+
+
+def test_detail_not_modified(user_client, recipe):
+    response = user_client.get(detail(recipe))
+    assert response.status_code == 200
+    assert response['Last-Modified']
+
+    cached = user_client.get(
+        detail(recipe), HTTP_IF_NONE_MATCH=response['ETag'])
+    assert cached.status_code == 304
+    assert cached['ETag'] == response['ETag']
+
+
+def test_detail_etag_follows_user_flags(user_client, user, recipe):
+    etag = user_client.get(detail(recipe))['ETag']
+    Favorite.objects.create(user=user, recipe=recipe)
+
+    response = user_client.get(detail(recipe), HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response['ETag'] != etag
+    assert response.data['is_favorited'] is True
+
+
+def test_detail_if_modified_since_for_anonymous(client, recipe):
+    response = client.get(detail(recipe), HTTP_IF_MODIFIED_SINCE=FUTURE)
+    assert response.status_code == 304
+
+
+def test_list_ignores_if_modified_since(client, recipe):
+    response = client.get(LIST)
+    assert 'Last-Modified' not in response
+    assert client.get(
+        LIST, HTTP_IF_MODIFIED_SINCE=FUTURE).status_code == 200
+    assert client.get(
+        f'{LIST}?search=Блины',
+        HTTP_IF_MODIFIED_SINCE=FUTURE).status_code == 200
+
+
+def test_cached_list_not_modified_until_recipe_deleted(
+        client, make_recipe, products, django_capture_on_commit_callbacks):
+    first = make_recipe([(products[0], 100)], name='Оладьи')
+    make_recipe([(products[1], 100)], name='Сырники')
+    etag = client.get(LIST)['ETag']
+    assert client.get(LIST, HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+    with django_capture_on_commit_callbacks(execute=True):
+        Recipe.objects.get(id=first.id).delete()
+    response = client.get(LIST, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response.data['count'] == 1
+
+
+def test_list_etag_is_not_a_sum_of_ids(user_client, user, make_recipe,
+                                       products):
+    recipes = [make_recipe([(products[0], 100)], name=f'Рецепт {number}')
+               for number in range(4)]
+    for recipe in (recipes[0], recipes[3]):
+        Favorite.objects.create(user=user, recipe=recipe)
+    etag = user_client.get(UNCACHED)['ETag']
+
+    # Другие рецепты с той же суммой id.
+    Favorite.objects.filter(user=user).delete()
+    for recipe in (recipes[1], recipes[2]):
+        Favorite.objects.create(user=user, recipe=recipe)
+    response = user_client.get(UNCACHED, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response['ETag'] != etag
@@ -0,0 +1,52 @@
+import io
+
+from django.core.management import call_command
+
+from recipes.models import Favorite, Recipe, Subscribe
+from users.models import User
+
+
+def test_counters_follow_relations(user, author, recipe):
+    Favorite.objects.create(user=user, recipe=recipe)
+    Subscribe.objects.create(user=user, author=author)
+    recipe.refresh_from_db()
+    author.refresh_from_db()
+    assert recipe.favorites_count == 1
+    assert author.followers_count == 1
+    assert author.recipes_count == 1
+
+    Favorite.objects.filter(user=user).delete()
+    recipe.refresh_from_db()
+    assert recipe.favorites_count == 0
+
+
+def test_full_save_keeps_counters(user, author, recipe):
+    stale_recipe = Recipe.objects.get(id=recipe.id)
+    stale_author = User.objects.get(id=author.id)
+    Favorite.objects.create(user=user, recipe=recipe)
+    Subscribe.objects.create(user=user, author=author)
+
+    stale_recipe.name = 'Тонкие блины'
+    stale_recipe.save()
+    stale_author.set_password('New-pass-2022')
+    stale_author.save()
+
+    recipe.refresh_from_db()
+    author.refresh_from_db()
+    assert recipe.name == 'Тонкие блины'
+    assert recipe.favorites_count == 1
+    assert author.followers_count == 1
+    assert author.check_password('New-pass-2022')
+
+
+def test_reconcile_counters_repairs_drift(user, author, recipe):
+    Favorite.objects.create(user=user, recipe=recipe)
+    Recipe.objects.update(favorites_count=7)
+    User.objects.filter(id=author.id).update(recipes_count=0)
+
+    call_command('reconcile_counters', stdout=io.StringIO())
+
+    recipe.refresh_from_db()
+    author.refresh_from_db()
+    assert recipe.favorites_count == 1
+    assert author.recipes_count == 1
@@ -0,0 +1,46 @@
+import io
+import random
+import time
+
+from django.core.management import call_command
+
+from api import list_cache, product_index, tag_cache
+from recipes.management.commands.generate_dataset import Command
+from recipes.models import Favorite, Recipe, ShoppingListItem, Subscribe
+
+
+def test_generate_dataset_resets_shared_caches(
+        products, django_capture_on_commit_callbacks):
+    keys = [tag_cache.VERSION_KEY, product_index.VERSION_KEY,
+            list_cache.GENERATION_KEY]
+    versions = list_cache.generations(keys)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        call_command(
+            'generate_dataset', users=5, recipes=10, favorites=10,
+            carts=5, subscriptions=5, tags=2, stdout=io.StringIO())
+
+    assert Recipe.objects.count() == 10
+    assert ShoppingListItem.objects.exists()
+    assert all(new != old for new, old in zip(
+        list_cache.generations(keys), versions))
+    assert len(tag_cache.tag_cache.snapshot()['tags']) == 2
+
+
+def test_self_pairs_excluded_only_for_subscriptions(user, author, tag):
+    recipe = Recipe.objects.create(
+        id=user.id, author=author, name='Блины', text='Описание',
+        cooking_time=10)
+    command = Command(stdout=io.StringIO())
+    command.rnd = random.Random(1)
+    command.exponent = 1.1
+    command.batch_size = 10
+    command.started = time.perf_counter()
+    command.total = 0
+
+    command.create_pairs(Favorite, 'recipe', 1, [user.id], [recipe.id])
+    command.create_pairs(
+        Subscribe, 'author', 1, [user.id], [user.id], exclude_self=True)
+
+    assert Favorite.objects.filter(user=user, recipe=recipe).exists()
+    assert not Subscribe.objects.exists()
@@ -0,0 +1,78 @@
+from api import list_cache
+from recipes.models import Favorite
+from users.models import User
+
+LIST = '/api/recipes/'
+
+
+def generation():
+    return list_cache.generations([list_cache.GENERATION_KEY])[0]
+
+
+def test_anonymous_page_served_from_cache(
+        client, recipe, django_assert_num_queries):
+    assert client.get(LIST).data['count'] == 1
+    with django_assert_num_queries(0):
+        assert client.get(LIST).data['results'][0]['name'] == 'Блины'
+
+
+def test_recipe_change_invalidates_after_commit(
+        client, recipe, django_capture_on_commit_callbacks):
+    client.get(LIST)
+    version = generation()
+
+    recipe.name = 'Тонкие блины'
+    recipe.save()
+    assert generation() == version
+    assert client.get(LIST).data['results'][0]['name'] == 'Блины'
+
+    with django_capture_on_commit_callbacks(execute=True):
+        recipe.save()
+    assert generation() != version
+    assert client.get(LIST).data['results'][0]['name'] == 'Тонкие блины'
+
+
+def test_login_and_password_keep_pages(
+        author, django_capture_on_commit_callbacks):
+    version = generation()
+    with django_capture_on_commit_callbacks(execute=True):
+        author.set_password('New-pass-2022')
+        author.save(update_fields=['password'])
+    assert generation() == version
+
+    with django_capture_on_commit_callbacks(execute=True):
+        author.first_name = 'Иван'
+        author.save()
+    assert generation() != version
+
+
+def test_tag_change_moves_only_its_generation(
+        tag, django_capture_on_commit_callbacks):
+    key = list_cache.TAG_GENERATION_KEY.format(tag.id)
+    before = list_cache.generations([list_cache.GENERATION_KEY, key])
+    with django_capture_on_commit_callbacks(execute=True):
+        tag.name = 'Утро'
+        tag.save()
+    after = list_cache.generations([list_cache.GENERATION_KEY, key])
+    assert after[0] == before[0]
+    assert after[1] != before[1]
+
+
+def test_cached_page_overlays_user_flags(user_client, user, recipe):
+    assert user_client.get(LIST).data['results'][0]['is_favorited'] is False
+    Favorite.objects.create(user=user, recipe=recipe)
+    result = user_client.get(LIST).data['results'][0]
+    assert result['is_favorited'] is True
+    assert result['author']['is_subscribed'] is False
+
+
+def test_signup_and_hidden_fields_keep_pages(
+        author, django_capture_on_commit_callbacks):
+    version = generation()
+    with django_capture_on_commit_callbacks(execute=True):
+        User.objects.create_user(
+            username='newcomer', email='newcomer@foodgram.ru')
+        author.role = 'admin'
+        author.save()
+        author.save(update_fields=['first_name'])
+    assert generation() == version
@@ -0,0 +1,23 @@
+import io
+
+from django.core.management import call_command
+
+from api.product_index import product_index
+
+
+def names(products):
+    return [product['name'] for product in products]
+
+
+def test_load_data_resets_product_index(
+        products, tmp_path, django_capture_on_commit_callbacks):
+    assert names(product_index.search('ябл')) == []
+    file_path = tmp_path / 'products.csv'
+    file_path.write_text(
+        'name,measurement_unit\nЯблоки,г\nМука,г\n', encoding='utf-8')
+
+    with django_capture_on_commit_callbacks(execute=True):
+        call_command('load_data', file=str(file_path), stdout=io.StringIO())
+
+    assert names(product_index.search('ябл')) == ['Яблоки']
+    assert names(product_index.search('мук')) == ['Мука']
@@ -0,0 +1,38 @@
+import re
+
+import pytest
+
+from rest_framework import serializers
+
+from api import metrics
+
+
+@pytest.fixture(autouse=True)
+def clear_registry():
+    metrics.registry.clear()
+    yield
+    metrics.registry.clear()
+
+
+def server_timing(response, name):
+    match = re.search(rf'{name};dur=([\d.]+)', response['Server-Timing'])
+    return float(match.group(1))
+
+
+@pytest.mark.django_db
+def test_render_time_in_server_timing(user_client, recipe):
+    response = user_client.get('/api/recipes/')
+    assert response.status_code == 200
+    assert server_timing(response, 'serializer') > 0
+    assert server_timing(response, 'total') >= server_timing(
+        response, 'serializer')
+    assert ('foodgram_serializer_duration_seconds_count'
+            '{route="api:recipes-list",method="GET"} 1'
+            in metrics.registry.render())
+
+
+def test_serializers_are_not_patched():
+    for serializer_class in (serializers.Serializer,
+                             serializers.ListSerializer):
+        assert serializer_class.data.fget.__module__ == (
+            'rest_framework.serializers')
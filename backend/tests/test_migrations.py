@@ -0,0 +1,32 @@
+import importlib
+from types import SimpleNamespace
+
+from django.db import connection
+from django.test import override_settings
+
+from recipes.models import FeedItem, Subscribe
+
+feed_migration = importlib.import_module('recipes.migrations.0006_feed_item')
+
+
+def feed(user):
+    return list(FeedItem.objects.filter(user=user).order_by(
+        '-recipe').values_list('recipe', flat=True))
+
+
+@override_settings(FEED_SIZE=2)
+def test_feed_migration_fills_feeds_from_subscriptions(
+        user, author, make_recipe):
+    recipes = [make_recipe([], name=f'Рецепт {number}')
+               for number in range(3)]
+    make_recipe([], name='Свой рецепт', author=user)
+    Subscribe.objects.create(user=user, author=author)
+    FeedItem.objects.all().delete()
+
+    # Схема уже создана, от schema_editor нужен только execute.
+    with connection.cursor() as cursor:
+        feed_migration.fill_feeds(
+            None, SimpleNamespace(execute=cursor.execute))
+
+    assert feed(user) == [recipes[2].id, recipes[1].id]
+    assert feed(author) == []
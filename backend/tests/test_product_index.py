@@ -0,0 +1,26 @@
+from api.product_index import product_index
+from recipes.models import Product
+
+
+def names(products):
+    return [product['name'] for product in products]
+
+
+def test_search_ranks_prefix_before_substring(products):
+    Product.objects.create(name='Сухое молоко', measurement_unit='г')
+    assert names(product_index.search('мол')) == ['Молоко', 'Сухое молоко']
+    assert names(product_index.search('мол', limit=1)) == ['Молоко']
+
+
+def test_product_change_reaches_index_after_commit(
+        products, django_capture_on_commit_callbacks):
+    assert names(product_index.search('ябл')) == []
+    with django_capture_on_commit_callbacks(execute=True):
+        Product.objects.create(name='Яблоки', measurement_unit='г')
+    assert names(product_index.search('ябл')) == ['Яблоки']
+
+
+def test_ingredients_endpoint_uses_index(client, products):
+    response = client.get('/api/ingredients/', {'name': 'Мо'})
+    assert response.status_code == 200
+    assert names(response.json()) == ['Молоко']
@@ -0,0 +1,33 @@
+import pytest
+from django.utils.connection import ConnectionDoesNotExist
+
+from api import replicas
+from api.tag_cache import tag_cache
+from recipes.models import Tag
+
+
+@pytest.fixture
+def lagging_replica():
+    """ Чтения запроса направлены в алиас, которого нет в DATABASES:
+        любое обращение к нему - ошибка. """
+    state = replicas.ReadState()
+    state.alias = 'lagging'
+    token = replicas.current.set(state)
+    yield state
+    replicas.current.reset(token)
+
+
+def test_reads_follow_request_state(lagging_replica, tag):
+    with pytest.raises(ConnectionDoesNotExist):
+        list(Tag.objects.all())
+
+
+def test_primary_overrides_request_state(lagging_replica, tag):
+    with replicas.primary():
+        assert list(Tag.objects.values_list('slug', flat=True)) == [
+            'breakfast']
+    assert replicas.current.get() is lagging_replica
+
+
+def test_tag_cache_rebuilds_from_primary(lagging_replica, tag):
+    assert tag_cache.snapshot()['slugs'] == {'breakfast': tag.id}
@@ -0,0 +1,32 @@
+import pytest
+from django.db import connection
+
+from recipes import search
+from recipes.models import Recipe
+
+pytestmark = pytest.mark.skipif(
+    connection.vendor != 'sqlite', reason='FTS5 есть только на SQLite')
+
+
+def found(query):
+    return list(search.search(Recipe.objects.all(), query).values_list(
+        'name', flat=True))
+
+
+def test_search_ranks_name_above_text(make_recipe, products):
+    make_recipe([], name='Сырники')
+    in_text = make_recipe([], name='Оладьи')
+    in_text.text = 'Почти блины, только толще'
+    in_text.save()
+    make_recipe([], name='Блины')
+
+    assert found('блин') == ['Блины', 'Оладьи']
+    assert found('"; DROP') == []
+    assert found('!!!') == []
+
+
+def test_deleted_recipe_leaves_index(make_recipe):
+    recipe = make_recipe([], name='Блины')
+    recipe.delete()
+    assert found('блины') == []
+    assert not Recipe.objects.exists()
@@ -0,0 +1,22 @@
+import pytest
+from rest_framework.exceptions import ValidationError
+
+from api.serializers import RecipeSerializer
+from api.tag_cache import tag_cache
+from recipes.models import Tag
+
+
+def test_validate_tags_falls_back_to_database(tag):
+    tag_cache.snapshot()
+    # Версия кэша сдвигается только после коммита, которого в тесте нет.
+    lunch = Tag.objects.create(name='Обед', color='#49B64E', slug='lunch')
+    assert not tag_cache.is_known(lunch.id)
+
+    assert RecipeSerializer().validate_tags(
+        [lunch.id, tag.id, lunch.id]) == [lunch.id, tag.id]
+
+
+def test_validate_tags_rejects_unknown_tag(tag):
+    with pytest.raises(ValidationError) as error:
+        RecipeSerializer().validate_tags([tag.id, 999])
+    assert error.value.detail == ['Тэга 999 не существует!']
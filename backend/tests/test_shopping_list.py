@@ -0,0 +1,69 @@
+import io
+
+import pytest
+from django.core.management import call_command
+
+from recipes import shopping_list
+from recipes.models import ShoppingCart, ShoppingListItem
+
+
+def totals(user):
+    return dict(ShoppingListItem.objects.filter(user=user).values_list(
+        'product__name', 'total'))
+
+
+@pytest.fixture
+def cart(user, recipe, make_recipe, products):
+    pancakes = make_recipe([(products[0], 50), (products[2], 2)],
+                           name='Оладьи')
+    ShoppingCart.objects.create(user=user, recipe=recipe)
+    ShoppingCart.objects.create(user=user, recipe=pancakes)
+    return pancakes
+
+
+def test_cart_changes_add_and_subtract(user, recipe, cart):
+    assert totals(user) == {'Мука': 250, 'Молоко': 300, 'Яйца': 2}
+
+    ShoppingCart.objects.get(user=user, recipe=recipe).delete()
+    assert totals(user) == {'Мука': 50, 'Яйца': 2}
+
+
+def test_recipe_ingredients_change_for_every_cart(
+        user, author, recipe, cart, products):
+    ShoppingCart.objects.create(user=author, recipe=recipe)
+
+    shopping_list.change_for_recipe(recipe.id, -1)
+    recipe.recipe_ingredient.filter(product_id=products[1]).delete()
+    recipe.recipe_ingredient.filter(
+        product_id=products[0]).update(amount=100)
+    shopping_list.change_for_recipe(recipe.id, 1)
+
+    assert totals(user) == {'Мука': 150, 'Яйца': 2}
+    assert totals(author) == {'Мука': 100}
+
+
+def test_rebuild_matches_incremental_totals(user, author, recipe, cart):
+    ShoppingCart.objects.create(user=author, recipe=recipe)
+    expected = {user: totals(user), author: totals(author)}
+    ShoppingListItem.objects.update(total=0)
+
+    shopping_list.rebuild([user.id])
+    assert totals(user) == expected[user]
+    assert totals(author) == {'Мука': 0, 'Молоко': 0}
+
+    shopping_list.rebuild()
+    assert totals(author) == expected[author]
+
+
+def test_empty_ids_change_nothing(user, cart):
+    before = totals(user)
+    shopping_list.change_for_user(user.id, [], 1)
+    shopping_list.rebuild([])
+    assert totals(user) == before
+
+
+def test_rebuild_command_for_selected_users(user, cart):
+    ShoppingListItem.objects.all().delete()
+    call_command('rebuild_shopping_lists', '--user', str(user.id),
+                 stdout=io.StringIO())
+    assert totals(user) == {'Мука': 250, 'Молоко': 300, 'Яйца': 2}
@@ -0,0 +1,34 @@
+from django.core.cache import cache
+
+from api.tag_cache import VERSION_KEY, get_version, tag_cache
+from recipes.models import Tag
+
+
+def test_tag_change_bumps_version_on_commit(
+        tag, django_capture_on_commit_callbacks):
+    version = get_version()
+    assert tag_cache.ids_for_slugs(['breakfast']) == [tag.id]
+
+    with django_capture_on_commit_callbacks(execute=True) as callbacks:
+        tag.slug = 'morning'
+        tag.save()
+        assert get_version() == version
+    assert callbacks
+
+    assert get_version() != version
+    assert tag_cache.ids_for_slugs(['breakfast', 'morning']) == [tag.id]
+
+
+def test_tag_delete_drops_it_from_snapshot(
+        tag, django_capture_on_commit_callbacks):
+    assert tag_cache.is_known(tag.id)
+    with django_capture_on_commit_callbacks(execute=True):
+        Tag.objects.filter(id=tag.id).delete()
+    assert not tag_cache.is_known(tag.id)
+
+
+def test_lost_version_does_not_repeat_known_one(tag):
+    tag_cache.snapshot()
+    known = get_version()
+    cache.delete(VERSION_KEY)
+    assert get_version() != known
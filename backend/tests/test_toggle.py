@@ -0,0 +1,54 @@
+from recipes.models import Favorite
+
+
+def favorite_url(recipe):
+    return f'/api/recipes/{recipe.id}/favorite/'
+
+
+def test_favorite_toggle_keeps_counter(user_client, user, recipe):
+    response = user_client.post(favorite_url(recipe))
+    assert response.status_code == 200
+    assert response.json()['id'] == recipe.id
+    recipe.refresh_from_db()
+    assert recipe.favorites_count == 1
+
+    repeated = user_client.post(favorite_url(recipe))
+    assert repeated.status_code == 400
+    assert repeated.json() == {'errors': 'Рецeпт уже в избранных'}
+
+    assert user_client.delete(favorite_url(recipe)).status_code == 204
+    recipe.refresh_from_db()
+    assert recipe.favorites_count == 0
+    assert not Favorite.objects.filter(user=user).exists()
+
+
+def test_shopping_cart_toggle_keeps_counter(user_client, recipe):
+    url = f'/api/recipes/{recipe.id}/shopping_cart/'
+    assert user_client.post(url).status_code == 200
+    recipe.refresh_from_db()
+    assert recipe.in_carts_count == 1
+    assert user_client.delete(url).status_code == 204
+    recipe.refresh_from_db()
+    assert recipe.in_carts_count == 0
+
+
+def test_subscribe_toggle_keeps_counter(user_client, author):
+    url = f'/api/users/{author.id}/subscribe/'
+    assert user_client.post(url).status_code == 201
+    author.refresh_from_db()
+    assert author.followers_count == 1
+    assert user_client.delete(url).status_code == 204
+    author.refresh_from_db()
+    assert author.followers_count == 0
+
+
+def test_toggle_without_handler_is_not_allowed(user_client, recipe):
+    response = user_client.put(favorite_url(recipe))
+    assert response.status_code == 405
+    assert response['Allow'] == 'POST, DELETE, OPTIONS'
+
+
+def test_toggle_requires_authentication(client, recipe):
+    response = client.post(favorite_url(recipe))
+    assert response.status_code == 401
+    assert response['WWW-Authenticate']
@@ -11,7 +11,28 @@ def validate_not_me(value):
         raise ValidationError('Нельзя использовать "me" как имя пользователя.')
 
 
-class User(AbstractUser):
+class CounterFieldsMixin:
+    """ Полный save() не пишет денормализованные счетчики.
+
+        Счетчики меняются только UPDATE ... F() из сигналов, а объект
+        в памяти (из кэша токенов, формы админки) может быть старым:
+        его save() затер бы актуальные значения.
+    """
+
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (not self._state.adding and kwargs.get('update_fields') is None
+                and not kwargs.get('force_insert')):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+class User(CounterFieldsMixin, AbstractUser):
     USER = 'user'
     ADMIN = 'admin'
     ROLE_CHOICES = [
@@ -48,6 +69,15 @@ class User(AbstractUser):
             'Required. min - 8 max - 20 characters, fewer.')
     )
     is_subscribed = models.BooleanField(default=False)
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Рецептов',
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Подписчиков',
+    )
+    counter_fields = ('recipes_count', 'followers_count')
 
     class Meta:
         constraints = [UniqueConstraint(